@@ -1,15 +1,14 @@
 
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
-from trading_signals import get_tiingo_data, calculate_technical_indicators
+from feature_store import load_features
 
 def preprocess_data(symbol, start_date, end_date):
-    # Get data and calculate technical indicators
-    raw_data = get_tiingo_data(symbol, start_date, end_date)
-    data_with_indicators = calculate_technical_indicators(raw_data)
+    # Get the technical indicators from the feature store (computed only when the bars change)
+    data_with_indicators = load_features(symbol, start_date, end_date)
 
     # Drop unnecessary columns
-    data_with_indicators.drop(columns=['open', 'volume', 'symbol'], inplace=True)
+    data_with_indicators = data_with_indicators.drop(columns=['open', 'volume'])
 
     # Scale the features
     scaler = MinMaxScaler()
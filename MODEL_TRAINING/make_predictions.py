@@ -2,18 +2,17 @@
 import pandas as pd
 import numpy as np
 import joblib
-from trading_signals import get_tiingo_data, calculate_technical_indicators
+from feature_store import load_features
 
 def make_predictions(symbol, start_date, end_date, model_path):
     # Load the trained ensemble model
     ensemble_model = joblib.load(model_path)
 
-    # Get stock data and calculate technical indicators
-    stock_data = get_tiingo_data(symbol, start_date, end_date)
-    stock_data = calculate_technical_indicators(stock_data)
+    # Get the technical indicators from the feature store (memory-mapped, computed only when the bars change)
+    stock_data = load_features(symbol, start_date, end_date)
 
     # Prepare data for prediction
-    X = stock_data.drop(columns=['symbol']).values
+    X = stock_data.values
 
     # Make predictions using the ensemble model
     predictions = ensemble_model.predict(X)
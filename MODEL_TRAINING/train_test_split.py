@@ -1,7 +1,7 @@
 
 import pandas as pd
 from sklearn.model_selection import train_test_split
-from trading_signals import get_tiingo_data, calculate_technical_indicators
+from feature_store import load_features
 
 # Define your trading strategy to generate the target variable (buy, sell, short, cover, hold)
 def generate_target_variable(df):
@@ -15,12 +15,11 @@ def generate_target_variable(df):
 symbol = "AAPL"
 start_date = "2020-01-01"
 end_date = "2020-12-31"
-raw_data = get_tiingo_data(symbol, start_date, end_date)
-data = calculate_technical_indicators(raw_data)
+data = load_features(symbol, start_date, end_date)
 data = generate_target_variable(data)
 
 # Split the data into training and testing datasets
-X = data.drop(columns=['signal', 'symbol'])
+X = data.drop(columns=['signal'])
 y = data['signal']
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
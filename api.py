@@ -4,10 +4,17 @@ import threading
 import time
 from flask import Flask, jsonify, request
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
+import numpy as np
+import pandas as pd
 
 from portfolio import Portfolio
-from trading_signals import get_tiingo_data, calculate_technical_indicators, generate_trading_signals
+from trading_signals import SIGNAL_COLUMNS, get_tiingo_data, generate_trading_signals
+from tiingo_fetcher import get_universe_data
+from panel_indicators import calculate_technical_indicators_panel
+from latency import latency, read_export
+from indicator_cache import IndicatorCache
+from market_feed import MarketFeed, Subscriptions, encode_rows, epoch_ms, market_data_room
 
 app = Flask(__name__)
 CORS(app)
@@ -20,6 +27,7 @@ alpaca_base_url = "https://paper-api.alpaca.markets"
 
 # Initialize portfolio
 portfolio = Portfolio(alpaca_api_key, alpaca_secret_key, alpaca_base_url)
+portfolio.ledger.start_reconciler(portfolio.api, interval=30)
 
 # Initialize symbols
 symbols_list = ['CG', 'ARES', 'BX', 'ALC', 'BSTZ', 'COLD', 'ET', 'FLEX', 'MX', 'MRK', 
@@ -38,41 +46,41 @@ def handle_symbols():
 
 @app.route('/portfolio/positions', methods=['GET'])
 def get_positions():
-    portfolio.update_positions()
-    return jsonify(portfolio.positions)
+    # Served from the ledger, which is reconciled with the broker in the background
+    return jsonify(portfolio.ledger.snapshot())
 
 @app.route('/portfolio/position', methods=['POST'])
 def add_position():
     data = request.get_json()
     portfolio.add_position(data['symbol'], data['shares'], data['buy_price'])
-    return jsonify(portfolio.positions)
+    return jsonify(portfolio.ledger.snapshot())
 
 @app.route('/portfolio/position', methods=['DELETE'])
 def remove_position():
-    for symbol in portfolio.positions:
+    for symbol in portfolio.ledger.snapshot():
         portfolio.remove_position(symbol)
 
 @app.route('/portfolio/trade', methods=['POST'])
 def execute_trade():
     data = request.get_json()
     portfolio.execute_trade(data['symbol'], data['signal'])
-    return jsonify(portfolio.positions)
+    return jsonify(portfolio.ledger.snapshot())
 
 @app.route('/portfolio/buy', methods=['POST'])
 def buy():
     symbol = request.args.get('symbol')
     portfolio.buy(symbol)
-    return jsonify(portfolio.positions)
+    return jsonify(portfolio.ledger.snapshot())
 
 @app.route('/portfolio/sell', methods=['POST'])
 def sell():
     symbol = request.args.get('symbol')
     portfolio.sell(symbol)
-    return jsonify(portfolio.positions)
+    return jsonify(portfolio.ledger.snapshot())
 
 @app.route("/portfolio/update_positions", methods=['POST'])
 def update_positions():
-    portfolio.update_positions()
+    portfolio.refresh_positions()
     return {"status": "positions updated"}
 
 @app.route("/portfolio/get_total_value", methods=['GET'])
@@ -81,7 +89,12 @@ def get_total_value():
 
 @app.route("/portfolio/get_cash", methods=['GET'])
 def get_buying_power():
-    return {"cash": portfolio.get_buying_power()}
+    return {"cash": portfolio.account_snapshot()['buying_power']}
+
+@app.route("/portfolio/account", methods=['GET'])
+def get_account():
+    # Served from a snapshot at most PORTFOLIO_CACHE_TTL seconds old
+    return jsonify(portfolio.account_snapshot())
 
 @app.route("/portfolio/get_history/<symbol>", methods=['GET'])
 def get_history(symbol: str):
@@ -91,48 +104,166 @@ def get_history(symbol: str):
 def get_asset_info(symbol: str):
     return portfolio.get_asset_info(symbol)
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # p50/p99/max per stage and symbol: the live trading loop's last export and this process's own trades
+    return jsonify({"live": read_export(), "api": latency.snapshot(), "indicator_cache": indicator_cache.stats()})
+
+# Symbols per /market_data page
+MARKET_DATA_PAGE_SIZE = 50
+
+# Columns returned by /market_data, next to the signal columns
+MARKET_DATA_COLUMNS = ['close'] + SIGNAL_COLUMNS
+SIGNAL_RESULT_COLUMNS = ['signal', 'buy_price', 'num_shares', 'short_sell_price', 'num_shares_shorted']
+
+def market_data_rows(frames, since=None):
+    """
+    Indicators and signals of every frame in one batched pass.
+
+    Returns {symbol: DataFrame} of the rows after since (epoch ms), with
+    MARKET_DATA_COLUMNS and the signal columns.
+    """
+    # Only the indicators the response and the signals read are computed
+    indicators = calculate_technical_indicators_panel(frames, MARKET_DATA_COLUMNS)
+
+    rows = {}
+    for symbol, df in indicators.items():
+        if since is not None:
+            df = df[np.asarray(epoch_ms(df.index)) > since]
+        if not df.empty:
+            rows[symbol] = df
+    if not rows:
+        return {}
+
+    # Signals are scored in one vectorized pass per market regime
+    by_regime = {}
+    for symbol in rows:
+        by_regime.setdefault(portfolio.get_market_regime(symbol), []).append(symbol)
+    for market_regime, symbols in by_regime.items():
+        batch = pd.concat([rows[symbol] for symbol in symbols])
+        signals = generate_trading_signals(batch, portfolio, market_regime, vectorized=True)
+        for symbol in symbols:
+            in_symbol = (batch['symbol'] == symbol).to_numpy()
+            result = rows[symbol][MARKET_DATA_COLUMNS].copy()
+            for column in SIGNAL_RESULT_COLUMNS:
+                result[column] = signals[column].to_numpy()[in_symbol]
+            rows[symbol] = result
+    return rows
+
 @app.route('/market_data', methods=['GET'])
 def execute_trades_by_signal():
-    global symbols_list
-    end_date = datetime.datetime.now()
-    start_date = end_date - datetime.timedelta(days=1)
+    """
+    Indicators and trading signals for a page of symbols, one columnar
+    frame per symbol (see market_feed.encode_rows).
 
-    # Fetch data from Tiingo
-    df = get_tiingo_data(symbols_list, start_date, end_date)
+    symbols: comma separated, symbols_list by default
+    offset, limit: the page of symbols (next_offset in the response is the next page, null after the last)
+    since: epoch ms, only rows after it. Pass back the response's since to poll for new bars;
+           it is the oldest of the symbols' last bars, so rows can repeat and merge by timestamp
+    days: how many days of bars the indicators are computed from (1 by default)
+    """
+    symbols = request.args.get('symbols')
+    symbols = [symbol.strip().upper() for symbol in symbols.split(',') if symbol.strip()] if symbols else list(symbols_list)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = max(request.args.get('limit', MARKET_DATA_PAGE_SIZE, type=int), 1)
+    since = request.args.get('since', type=int)
+    days = request.args.get('days', 1, type=float)
 
-    # Calculate technical indicators
-    df_indicators = calculate_technical_indicators(df)
+    page = symbols[offset:offset + limit]
+    end_date = datetime.datetime.now()
+    start_date = end_date - datetime.timedelta(days=days)
 
-    # Generate trading signals
-    signals = generate_trading_signals(df_indicators, portfolio)
+    # Fetch every symbol of the page concurrently
+    frames = {symbol: df for symbol, df in get_universe_data(page, start_date, end_date).items() if df is not None and not df.empty}
+    for symbol, df in frames.items():
+        portfolio.on_price(symbol, df['close'].iloc[-1])
+    rows = market_data_rows(frames, since) if frames else {}
 
-    return jsonify(signals)
+    # No symbol can miss a bar by polling from here
+    latest = min((epoch_ms(df.index[-1:])[0] for df in rows.values()), default=since)
+    return jsonify({
+        "symbols": {symbol: encode_rows(df) for symbol, df in rows.items()},
+        "since": latest,
+        "next_offset": offset + limit if offset + limit < len(symbols) else None,
+    })
 
 # define market data fetching and sending over websocket
 
+# Indicators of the last fetch per symbol, recomputed only when a new bar comes in
+indicator_cache = IndicatorCache()
+# What each client has been sent, so pushes only carry new and changed rows
+market_feed = MarketFeed()
+
+# Symbols each client watches; every symbol has a room its pushes go to
+market_subscriptions = Subscriptions()
+
+@socketio.on('subscribe_market_data')
+def subscribe_market_data(data):
+    # Join the symbols' rooms and get their full frames once, then follow the deltas.
+    # Subscribing again to a symbol is how an out of sync client gets a new snapshot.
+    symbols = data.get('symbols', [])
+    market_subscriptions.add(request.sid, symbols)
+    for symbol in symbols:
+        join_room(market_data_room(symbol))
+    for message in market_feed.snapshots(symbols):
+        message['positions'] = portfolio.ledger.snapshot()
+        emit('market_data', message)
+
+@socketio.on('unsubscribe_market_data')
+def unsubscribe_market_data(data):
+    symbols = data.get('symbols', [])
+    market_subscriptions.remove(request.sid, symbols)
+    for symbol in symbols:
+        leave_room(market_data_room(symbol))
+
+@socketio.on('disconnect')
+def forget_market_subscriptions(*args):
+    # Socket.IO empties the client's rooms itself
+    market_subscriptions.remove(request.sid)
+
+def mark_unwatched_positions(watched):
+    # Held symbols nobody watches get no bars here; mark them from one batched latest trades request
+    held = [symbol for symbol in portfolio.ledger.snapshot() if symbol not in watched]
+    if not held:
+        return
+    try:
+        prices = portfolio.fetch_latest_prices(held)
+    except Exception as e:
+        print(f"Could not fetch latest prices for {held}: {e}")
+        return
+    for symbol, price in prices.items():
+        portfolio.on_price(symbol, price)
+
 def fetch_and_send_market_data():
     global symbols_list
     while True:
-        for symbol in symbols_list:
+        # Only the symbols someone is watching are fetched and computed
+        watched = market_subscriptions.symbols()
+        symbols = [symbol for symbol in symbols_list if symbol in watched]
+        mark_unwatched_positions(watched)
+        if not symbols:
+            time.sleep(5)
+        for symbol in symbols:
             end_date = datetime.datetime.now()
             start_date = end_date - datetime.timedelta(days=1)
 
             # Fetch data from Tiingo
             df = get_tiingo_data(symbol, start_date, end_date)
 
-            # Calculate technical indicators
-            df_indicators = calculate_technical_indicators(df)
+            if df is not None and not df.empty:
+                # Positions are marked with the latest close between reconciles
+                portfolio.on_price(symbol, df['close'].iloc[-1])
+
+                # Calculate the market data indicators (cached until the symbol has a new bar)
+                df_indicators = indicator_cache.get(symbol, df, MARKET_DATA_COLUMNS)
 
+                # Only the rows that are new or changed since the last push (nothing without a new bar)
+                data = market_feed.update(symbol, df_indicators)
+                if data is not None:
+                    data["positions"] = portfolio.ledger.snapshot()
 
-            data = {
-                "symbol": symbol,  # adding symbol to the data
-                "data": df_indicators.to_json(),
-                "positions": portfolio.positions,
-                
-            }
-            
-            # Send the data to the client over WebSocket
-            socketio.emit('market_data', data)
+                    # Send the data to the clients watching the symbol
+                    socketio.emit('market_data', data, to=market_data_room(symbol))
 
             # wait for a certain period of time (for example, 1 second) before fetching the data again
             time.sleep(5)
@@ -0,0 +1,87 @@
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+# Minute bars are stored as one Parquet file per symbol and (UTC) day:
+#   bar_cache/AAPL/2023-06-01.parquet
+# A day that is in the cache is never requested from Tiingo again, except for
+# today, which is always refetched because it is still being filled in. Bars
+# fetched for today (or later) go to a separate partial file:
+#   bar_cache/AAPL/2023-06-01.partial.parquet
+# which is served until the day is over but never counts as complete, so the
+# day is fetched again in full once it is in the past.
+BAR_CACHE_DIR = os.environ.get("BAR_CACHE_DIR", "./bar_cache")
+
+
+def _to_day(value):
+    return pd.Timestamp(value).date()
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def partition_path(symbol, day, partial=False):
+    suffix = ".partial.parquet" if partial else ".parquet"
+    return os.path.join(BAR_CACHE_DIR, symbol, f"{day:%Y-%m-%d}{suffix}")
+
+
+def missing_ranges(symbol, start_date, end_date):
+    """
+    Return the (start_day, end_day) ranges between start_date and end_date
+    (inclusive) that are not in the cache yet, merged into contiguous runs so
+    each run can be fetched with a single request.
+    """
+    today = _today()
+    ranges = []
+    for day in pd.date_range(_to_day(start_date), _to_day(end_date), freq="D").date:
+        if day < today and os.path.exists(partition_path(symbol, day)):
+            continue
+        if ranges and (day - ranges[-1][1]).days == 1:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return [tuple(day_range) for day_range in ranges]
+
+
+def write_bars(symbol, df, start_day, end_day):
+    """
+    Store the bars fetched for start_day..end_day, one file per day. Past days
+    without any bars (weekends, holidays) get an empty file so they are not
+    requested again.
+    """
+    os.makedirs(os.path.join(BAR_CACHE_DIR, symbol), exist_ok=True)
+    today = _today()
+    if df is None:
+        df = pd.DataFrame()
+    days = df.index.date if len(df) else []
+    for day in pd.date_range(start_day, end_day, freq="D").date:
+        day_bars = df[days == day] if len(df) else df
+        if day_bars.empty and day >= today:
+            continue
+        # Days that are not over yet may still get bars, so they are only stored as partial
+        complete = day < today
+        path = partition_path(symbol, day, partial=not complete)
+        # Write to a temporary file first so a crash never leaves a half written partition
+        day_bars.to_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        if complete and os.path.exists(partition_path(symbol, day, partial=True)):
+            os.remove(partition_path(symbol, day, partial=True))
+
+
+def read_bars(symbol, start_date, end_date):
+    """Load the cached bars for start_date..end_date, or None if there are none."""
+    frames = []
+    for day in pd.date_range(_to_day(start_date), _to_day(end_date), freq="D").date:
+        path = partition_path(symbol, day)
+        if not os.path.exists(path):
+            path = partition_path(symbol, day, partial=True)
+        if os.path.exists(path):
+            day_bars = pd.read_parquet(path)
+            if not day_bars.empty:
+                frames.append(day_bars)
+    if not frames:
+        return None
+    return pd.concat(frames)
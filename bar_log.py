@@ -0,0 +1,229 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from streaming_indicators import CHIKOU_SHIFT
+
+
+# Live bars are appended to one binary log per symbol:
+#   data-training/AAPL.barlog
+# The file starts with a one line JSON header naming the columns, followed by
+# fixed size records (int64 timestamp in ns, then one float64 per column).
+# Records are only ever appended; compact() turns a log into the CSV used for
+# training once the trading session is over.
+BAR_LOG_DIR = os.environ.get("BAR_LOG_DIR", "./data-training")
+
+
+def log_path(symbol, log_dir=BAR_LOG_DIR):
+    return os.path.join(log_dir, f'{symbol}.barlog')
+
+
+def record_dtype(columns):
+    return np.dtype([('timestamp', '<i8')] + [(column, '<f8') for column in columns])
+
+
+def _header(columns):
+    return (json.dumps({'version': 1, 'columns': list(columns)}) + '\n').encode()
+
+
+def _read_header(f):
+    header = json.loads(f.readline())
+    return header['columns'], f.tell()
+
+
+def to_records(columns, timestamps, values):
+    """Pack timestamps (datetime64[ns] or int ns) and a (rows, columns) array into log records."""
+    values = np.asarray(values, dtype=np.float64).reshape(-1, len(columns))
+    records = np.empty(len(values), dtype=record_dtype(columns))
+    records['timestamp'] = np.asarray(timestamps).astype('datetime64[ns]').view('i8')
+    for i, column in enumerate(columns):
+        records[column] = values[:, i]
+    return records
+
+
+def append_records(path, columns, records):
+    """Append records to a log, writing the header if the file is new."""
+    with open(path, 'ab') as f:
+        if f.tell() == 0:
+            f.write(_header(columns))
+        else:
+            with open(path, 'rb') as existing:
+                logged_columns, _ = _read_header(existing)
+            if logged_columns != list(columns):
+                raise ValueError(f"{path} has columns {logged_columns}, not {list(columns)}")
+        f.write(records.tobytes())
+
+
+def read_log(path):
+    """Read a bar log into a DataFrame with a UTC DatetimeIndex named 'date'."""
+    with open(path, 'rb') as f:
+        columns, offset = _read_header(f)
+    dtype = record_dtype(columns)
+    size = os.path.getsize(path) - offset
+    # A record cut short by a crash mid-write is dropped
+    records = np.fromfile(path, dtype=dtype, count=size // dtype.itemsize, offset=offset)
+    index = pd.DatetimeIndex(records['timestamp'].view('datetime64[ns]'), name='date').tz_localize('UTC')
+    return pd.DataFrame({column: records[column] for column in columns}, index=index)
+
+
+def last_timestamp(path):
+    """Timestamp (datetime64[ns]) of the last complete record of a log, or None if it has none."""
+    try:
+        with open(path, 'rb') as f:
+            columns, offset = _read_header(f)
+            dtype = record_dtype(columns)
+            count = (os.path.getsize(path) - offset) // dtype.itemsize
+            if count == 0:
+                return None
+            f.seek(offset + (count - 1) * dtype.itemsize)
+            return np.frombuffer(f.read(8), dtype='<i8')[0].astype('datetime64[ns]')
+    except FileNotFoundError:
+        return None
+
+
+def compact(symbol, log_dir=BAR_LOG_DIR, output_path=None):
+    """
+    Turn a symbol's log into a training CSV. Run it offline, while nothing is
+    appending to the log.
+
+    Repeated timestamps keep their last record, and chikou_span (which can
+    only be known CHIKOU_SHIFT bars later, so is logged as 0) is filled in
+    from the close. The log itself is rewritten without the duplicates.
+    """
+    path = log_path(symbol, log_dir)
+    df = read_log(path)
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    if 'chikou_span' in df.columns:
+        df['chikou_span'] = df['close'].shift(-CHIKOU_SHIFT).fillna(0)
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    append_records(tmp_path, list(df.columns), to_records(list(df.columns), df.index.tz_localize(None).values, df.values))
+    os.replace(tmp_path, path)
+
+    if output_path is None:
+        output_path = os.path.join(log_dir, f'{symbol}_data.csv')
+    df.to_csv(output_path)
+    return df
+
+
+class BarLogWriter:
+    """
+    Writes bars to the per-symbol logs from a background thread.
+
+    append() only puts the bar on a queue. The writer thread collects bars
+    until it has batch_size of them or flush_interval seconds have passed,
+    then appends each symbol's bars to its log with a single write. close()
+    writes out whatever is still queued and stops the thread; it is also
+    registered to run at exit, so the last bars are not lost on shutdown.
+    """
+
+    def __init__(self, columns, log_dir=BAR_LOG_DIR, batch_size=256, flush_interval=5.0):
+        self.columns = list(columns)
+        self.log_dir = log_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        # Newest timestamp queued per symbol, so history is not logged twice
+        self.last_queued = {}
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                os.makedirs(self.log_dir, exist_ok=True)
+                self.thread = threading.Thread(target=self._run, name='bar-log-writer', daemon=True)
+                self.thread.start()
+                atexit.register(self.close)
+
+    def append(self, symbol, timestamp, row):
+        """Queue one bar. row is a dict (or sequence in column order) of values."""
+        if self.thread is None:
+            self.start()
+        if isinstance(row, dict):
+            row = [row.get(column, 0.0) for column in self.columns]
+        timestamp = np.datetime64(timestamp, 'ns')
+        self.last_queued[symbol] = timestamp
+        self.queue.put((symbol, timestamp, row))
+
+    def append_frame(self, symbol, df):
+        """
+        Queue the rows of a frame, e.g. the history loaded at startup, that
+        are newer than anything already logged or queued for the symbol, so
+        loading the same history after a restart adds only the bars the log
+        is missing.
+        """
+        timestamps = pd.DatetimeIndex(df.index)
+        if timestamps.tz is not None:
+            timestamps = timestamps.tz_convert('UTC').tz_localize(None)
+        timestamps = timestamps.values.astype('datetime64[ns]')
+        logged = [t for t in (self.last_queued.get(symbol), last_timestamp(log_path(symbol, self.log_dir))) if t is not None]
+        new = timestamps > max(logged) if logged else np.ones(len(timestamps), dtype=bool)
+        values = df.reindex(columns=self.columns).fillna(0).to_numpy(dtype=np.float64)
+        for timestamp, row in zip(timestamps[new], values[new]):
+            self.append(symbol, timestamp, row)
+
+    def flush(self):
+        """Block until everything queued so far is on disk."""
+        if self.thread is not None:
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait()
+
+    def close(self):
+        """Write out everything queued and stop the writer thread."""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+            atexit.unregister(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = {}
+            count = 0
+            waiters = []
+            deadline = time.monotonic() + self.flush_interval
+            while count < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    break
+                symbol, timestamp, row = item
+                batch.setdefault(symbol, []).append((timestamp, row))
+                count += 1
+
+            for symbol, rows in batch.items():
+                try:
+                    timestamps, values = zip(*rows)
+                    append_records(log_path(symbol, self.log_dir), self.columns, to_records(self.columns, timestamps, values))
+                except Exception:
+                    traceback.print_exc()
+            for waiter in waiters:
+                waiter.set()
+
+
+if __name__ == "__main__":
+    # python bar_log.py [SYMBOL ...]  -- compacts every log when no symbol is given
+    symbols = sys.argv[1:] or [name[:-len('.barlog')] for name in os.listdir(BAR_LOG_DIR) if name.endswith('.barlog')]
+    for symbol in symbols:
+        df = compact(symbol)
+        print(f"Compacted {symbol}: {len(df)} bars")
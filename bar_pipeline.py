@@ -0,0 +1,164 @@
+import asyncio
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from data_visualization import plot_data
+from latency import latency
+from streaming_indicators import CHIKOU_SHIFT
+from trading_signals import generate_trading_signals
+
+
+# Pool used for chart rendering: 'thread' or 'process'. It is the only stage
+# that can move to processes; the indicator and signal stage is thread-only
+# (see BarPipeline).
+BAR_POOL = os.environ.get("BAR_POOL", "thread")
+BAR_POOL_WORKERS = int(os.environ.get("BAR_POOL_WORKERS", "4"))
+
+# pyplot keeps global state, so charts are drawn one at a time per process
+_plot_lock = threading.Lock()
+
+
+def make_pool(kind, workers):
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bar-output')
+    raise ValueError(f"Unknown pool kind {kind!r}, expected 'thread' or 'process'")
+
+
+def write_outputs(symbol, plot_frame):
+    """Redraw a symbol's chart. Runs on the output pool."""
+    with _plot_lock:
+        plot_data(plot_frame, symbol, './plots/')
+
+
+class BarPipeline:
+    """
+    Processes streamed minute bars off the stream's event loop.
+
+    handle_bar only puts the bar on its symbol's queue, so the stream can
+    read the next message straight away. One worker task per symbol takes
+    bars off the queue in order and runs the stages (each one is timed in
+    the latency histograms, starting with 'ingest': the time a bar waited
+    between arriving and being processed):
+
+    1. process_bar on a thread pool: update the indicators and ring buffer,
+       queue the bar on the bar log, mark the portfolio and generate the
+       signal. A symbol's bars are processed one at a time in arrival
+       order. This stage always runs on threads, whatever BAR_POOL says: it
+       updates state the rest of the process reads (the StreamingIndicators,
+       ring buffers, ledger and price cache), which a process pool would
+       have to copy to and from the worker on every bar. The work per bar is
+       an incremental indicator update and scoring one row, which costs
+       less than that copy would.
+    2. The signal is handed to the order executor.
+    3. The chart: handed to the ChartRenderer if there is one, which draws
+       it on its own thread at a limited rate. Otherwise write_outputs runs
+       plot_data on the output pool (thread or process, see BAR_POOL).
+       A symbol has at most one output job running; if bars arrive while it
+       is busy only the newest snapshot is drawn next.
+    """
+
+    def __init__(self, bar_data, indicators, portfolio, executor, bar_log=None, renderer=None, pool=BAR_POOL, workers=BAR_POOL_WORKERS):
+        self.bar_data = bar_data
+        self.bar_log = bar_log
+        self.renderer = renderer
+        self.indicators = indicators
+        self.portfolio = portfolio
+        self.executor = executor
+        self.state_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bar-state')
+        self.output_pool = make_pool(pool, workers)
+        self.queues = {}
+        self.tasks = {}
+        self.outputs_running = {}
+        self.pending_outputs = {}
+
+    async def handle_bar(self, bar):
+        queue = self.queues.get(bar.symbol)
+        if queue is None:
+            queue = self.queues[bar.symbol] = asyncio.Queue()
+            self.tasks[bar.symbol] = asyncio.get_running_loop().create_task(self._worker(bar.symbol, queue))
+        queue.put_nowait((bar, time.perf_counter_ns()))
+
+    async def join(self):
+        """Wait until every queued bar has been processed."""
+        await asyncio.gather(*(queue.join() for queue in self.queues.values()))
+
+    async def _worker(self, symbol, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            bar, received = await queue.get()
+            try:
+                signal, outputs = await loop.run_in_executor(self.state_pool, self.process_bar, bar, received)
+                if signal is not None:
+                    # Hand the trade to the order workers so broker latency never blocks the stream
+                    self.executor.submit(symbol, signal, received)
+                if self.renderer is not None:
+                    self.renderer.submit(*outputs)
+                else:
+                    self._schedule_outputs(symbol, outputs)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                queue.task_done()
+
+    def process_bar(self, bar, received=None):
+        """Update the symbol's state with a bar. Returns (signal or None, output args)."""
+        if received is not None:
+            latency.since('ingest', bar.symbol, received)
+        start = time.perf_counter_ns()
+        timestamp = np.datetime64(int(bar.timestamp), 'ns')
+        store = self.bar_data[bar.symbol]
+
+        # Check if the timestamp is already in the store
+        if store.last_timestamp is not None and timestamp <= store.last_timestamp:
+            # Append unique suffix to avoid overwriting
+            timestamp = store.last_timestamp + np.timedelta64(1, 'ns')
+
+        # Update the indicators with only the new bar instead of recomputing the whole history
+        row = self.indicators[bar.symbol].update(bar.high, bar.low, bar.close)
+        row.update(open=bar.open, high=bar.high, low=bar.low, close=bar.close, volume=bar.volume)
+        store.append(timestamp, row)
+        if self.bar_log is not None:
+            # Only the new row goes to disk; chikou_span is filled in when the log is compacted
+            self.bar_log.append(bar.symbol, timestamp, row)
+        self.portfolio.on_price(bar.symbol, bar.close)
+        # The close of this bar is the chikou span of the bar CHIKOU_SHIFT rows back
+        store.set_value(CHIKOU_SHIFT, 'chikou_span', bar.close)
+        latency.since('indicators', bar.symbol, start)
+
+        # The buffer keeps changing while the chart is drawn, so it gets its own copy
+        #make data_for_plot the most recent 50 rows of bar_data
+        outputs = (bar.symbol, store.frame(last=50).copy())
+
+        # Wait until there is enough history for the 200 bar SMA
+        if store.column('sma_200', last=1)[-1] == 0.0:
+            return None, outputs
+        latest_data = store.frame(last=1, with_symbol=True)
+        with latency.timer('regime', bar.symbol):
+            market_regime = self.portfolio.get_market_regime(bar.symbol)
+        with latency.timer('signal', bar.symbol):
+            signals = generate_trading_signals(latest_data, self.portfolio, market_regime)
+        return signals['signal'].iloc[-1], outputs
+
+    def _schedule_outputs(self, symbol, outputs):
+        if symbol in self.outputs_running:
+            # Replaces any older snapshot that has not been written yet
+            self.pending_outputs[symbol] = outputs
+            return
+        future = asyncio.get_running_loop().run_in_executor(self.output_pool, write_outputs, *outputs)
+        self.outputs_running[symbol] = future
+        future.add_done_callback(lambda done: self._outputs_done(symbol, done))
+
+    def _outputs_done(self, symbol, future):
+        del self.outputs_running[symbol]
+        if not future.cancelled() and future.exception() is not None:
+            traceback.print_exception(future.exception())
+        outputs = self.pending_outputs.pop(symbol, None)
+        if outputs is not None:
+            self._schedule_outputs(symbol, outputs)
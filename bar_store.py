@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+class BarRingBuffer:
+    """
+    Fixed capacity, NumPy backed store of bars and indicator columns for one symbol.
+
+    All memory is allocated up front and appending a bar only writes into the
+    preallocated arrays, so memory stays constant no matter how long the
+    session runs. Once the buffer is full the oldest bar is overwritten.
+
+    Every row is written twice, at slot i and at slot i + capacity, so the
+    most recent bars always sit in one contiguous slice of the array and can
+    be handed to pandas without copying.
+    """
+
+    def __init__(self, symbol, columns, capacity=8192):
+        self.symbol = symbol
+        self.columns = list(columns)
+        self.column_index = {column: i for i, column in enumerate(self.columns)}
+        self.capacity = capacity
+        self.values = np.zeros((2 * capacity, len(self.columns)), dtype='f8')
+        self.timestamps = np.zeros(2 * capacity, dtype='datetime64[ns]')
+        self.position = 0
+        self.size = 0
+
+    @classmethod
+    def from_frame(cls, symbol, df, columns, capacity=8192):
+        """Create a buffer holding the most recent rows of df (indexed by date)."""
+        store = cls(symbol, columns, capacity)
+        df = df.iloc[-capacity:]
+        timestamps = pd.to_datetime(df.index, utc=True).tz_localize(None).to_numpy(dtype='datetime64[ns]')
+        values = df.reindex(columns=store.columns).fillna(0).to_numpy(dtype='f8')
+        for timestamp, row in zip(timestamps, values):
+            store.append(timestamp, row)
+        return store
+
+    def __len__(self):
+        return self.size
+
+    def append(self, timestamp, row):
+        """
+        Add one bar. row is either a dict keyed by column name (missing
+        columns are stored as 0) or a sequence in self.columns order.
+        """
+        slot = self.position
+        mirror = slot + self.capacity
+        if isinstance(row, dict):
+            self.values[slot] = 0.0
+            for column, value in row.items():
+                i = self.column_index.get(column)
+                if i is not None:
+                    self.values[slot, i] = value
+        else:
+            self.values[slot] = row
+        self.values[mirror] = self.values[slot]
+        self.timestamps[slot] = timestamp
+        self.timestamps[mirror] = timestamp
+        self.position = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def set_value(self, rows_back, column, value):
+        """Overwrite a column of the bar rows_back bars before the latest one."""
+        if rows_back >= self.size:
+            return
+        slot = (self.position - 1 - rows_back) % self.capacity
+        i = self.column_index[column]
+        self.values[slot, i] = value
+        self.values[slot + self.capacity, i] = value
+
+    @property
+    def last_timestamp(self):
+        if self.size == 0:
+            return None
+        return self.timestamps[(self.position - 1) % self.capacity]
+
+    def _window(self, last=None):
+        count = self.size if last is None else min(last, self.size)
+        stop = self.position + self.capacity
+        return stop - count, stop
+
+    def to_numpy(self, last=None):
+        """View (not a copy) of the most recent rows, oldest first."""
+        start, stop = self._window(last)
+        return self.values[start:stop]
+
+    def column(self, column, last=None):
+        """View of a single column for the most recent rows."""
+        start, stop = self._window(last)
+        return self.values[start:stop, self.column_index[column]]
+
+    def frame(self, last=None, with_symbol=False):
+        """
+        DataFrame over the most recent rows that shares memory with the buffer.
+
+        The frame is only valid until the next append. Pass with_symbol=True to
+        add the symbol column that the signal code expects (this adds a copy,
+        so keep it to small slices).
+        """
+        start, stop = self._window(last)
+        index = pd.DatetimeIndex(self.timestamps[start:stop], name='date').tz_localize('UTC')
+        df = pd.DataFrame(self.values[start:stop], index=index, columns=self.columns, copy=False)
+        if with_symbol:
+            df = df.assign(symbol=self.symbol)
+        return df
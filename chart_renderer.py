@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+import traceback
+
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import pandas as pd
+
+
+# A symbol's chart is redrawn at most once every CHART_MIN_INTERVAL seconds
+CHART_MIN_INTERVAL = float(os.environ.get("CHART_MIN_INTERVAL", "30"))
+
+FIB_COLUMNS = ['fib_0', 'fib_0.236', 'fib_0.382', 'fib_0.5', 'fib_0.618', 'fib_0.786', 'fib_1']
+FIB_COLORS = ['red', 'orange', 'yellow', 'green', 'blue', 'indigo', 'violet']
+
+# Indicator columns drawn by the chart (the same ones plot_data draws)
+CHART_COLUMNS = ['sma_50', 'sma_200', 'upper_bb', 'middle_bb', 'lower_bb', 'rsi', 'macd', 'macd_signal',
+                 'senkou_span_a', 'senkou_span_b'] + FIB_COLUMNS
+
+
+def _dates(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return mdates.date2num(index.values)
+
+
+class SymbolChart:
+    """
+    The plot_data figure for one symbol, built once and updated in place.
+
+    The lines keep their artists and only get new data on update(); the
+    shaded areas (fill_between) cannot be updated in place, so just those
+    are replaced. The figure is drawn with the Agg canvas directly, without
+    pyplot, so charts can be drawn off the main thread.
+    """
+
+    def __init__(self, symbol, figsize=(14, 7 * 7)):
+        self.symbol = symbol
+        self.figure = Figure(figsize=figsize)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axs = self.figure.subplots(5)
+        self.lines = []
+        self.fills = []
+
+        price_ax, bb_ax, rsi_ax, macd_ax, fib_ax = self.axs
+        for ax in (price_ax, bb_ax):
+            # Legend entries for the Ichimoku cloud drawn by _draw_fills
+            ax.fill_between([], [], [], color='lightgreen', alpha=0.5, label='Senkou Span A >= Senkou Span B')
+            ax.fill_between([], [], [], color='lightcoral', alpha=0.5, label='Senkou Span A < Senkou Span B')
+
+        self._line(price_ax, 'close', label='Close')
+        self._line(price_ax, 'sma_50', label='SMA 50')
+        self._line(price_ax, 'sma_200', label='SMA 200')
+        price_ax.set_title(f'{symbol} - Price and Moving Averages')
+
+        self._line(bb_ax, 'close', label='Close')
+        self._line(bb_ax, 'upper_bb', label='Upper BB')
+        self._line(bb_ax, 'middle_bb', label='Middle BB')
+        self._line(bb_ax, 'lower_bb', label='Lower BB')
+        bb_ax.set_title(f'{symbol} - Bollinger Bands')
+
+        self._line(rsi_ax, 'rsi', label='RSI')
+        rsi_ax.axhline(y=30, color='green', linestyle='--')
+        rsi_ax.axhline(y=70, color='red', linestyle='--')
+        rsi_ax.set_title(f'{symbol} - RSI')
+
+        self._line(macd_ax, 'macd', label='MACD')
+        self._line(macd_ax, 'macd_signal', label='Signal')
+        macd_ax.set_title(f'{symbol} - MACD')
+
+        self._line(fib_ax, 'close', label='Close')
+        for level, color in zip(FIB_COLUMNS, FIB_COLORS):
+            self._line(fib_ax, level, label=level, color=color)
+        fib_ax.set_title(f'{symbol} - Fibonacci Levels')
+
+        for ax in self.axs:
+            ax.xaxis_date()
+            ax.legend()
+            ax.set_xlabel('Date')
+            ax.set_ylabel('Value')
+            ax.grid(True)
+
+    def _line(self, ax, column, **kwargs):
+        line, = ax.plot([], [], **kwargs)
+        self.lines.append((ax, column, line))
+
+    def _draw_fills(self, x, df):
+        for fill in self.fills:
+            fill.remove()
+        span_a = df['senkou_span_a'].to_numpy()
+        span_b = df['senkou_span_b'].to_numpy()
+        self.fills = []
+        for ax in self.axs[:2]:
+            self.fills.append(ax.fill_between(x, span_a, span_b, where=span_a >= span_b, color='lightgreen', alpha=0.5))
+            self.fills.append(ax.fill_between(x, span_a, span_b, where=span_a < span_b, color='lightcoral', alpha=0.5))
+        fib_ax = self.axs[4]
+        for level, next_level, color in zip(FIB_COLUMNS, FIB_COLUMNS[1:], FIB_COLORS):
+            self.fills.append(fib_ax.fill_between(x, df[level].to_numpy(), df[next_level].to_numpy(), color=color, alpha=0.1))
+
+    def update(self, df):
+        x = _dates(df.index)
+        for ax, column, line in self.lines:
+            line.set_data(x, df[column].to_numpy())
+        self._draw_fills(x, df)
+
+        for ax in self.axs:
+            ax.relim()
+            ax.autoscale_view()
+        # Price panels are scaled to the close, like plot_data
+        y_min = df['close'].min()
+        y_max = df['close'].max()
+        if y_min < y_max:
+            for ax in (self.axs[0], self.axs[1], self.axs[4]):
+                ax.set_ylim(y_min, y_max)
+
+    def save(self, path):
+        # Written next to the target and moved into place so readers never see half a PNG
+        tmp_path = path + '.tmp.png'
+        self.canvas.print_png(tmp_path)
+        os.replace(tmp_path, path)
+
+
+class ChartRenderer:
+    """
+    Draws the live charts on a background thread.
+
+    submit(symbol, df) only stores the frame as the symbol's latest data and
+    returns. The renderer thread redraws a symbol's chart (keeping one
+    SymbolChart per symbol) once it has new data and at least min_interval
+    seconds have passed since its last draw. Frames that are replaced before
+    they are drawn are never drawn.
+    """
+
+    def __init__(self, output_dir='./plots/', min_interval=CHART_MIN_INTERVAL):
+        self.output_dir = output_dir
+        self.min_interval = min_interval
+        self.charts = {}
+        self.latest = {}
+        self.last_render = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self.thread = threading.Thread(target=self._run, name='chart-renderer', daemon=True)
+                self.thread.start()
+
+    def submit(self, symbol, df):
+        if self.thread is None:
+            self.start()
+        with self.lock:
+            self.latest[symbol] = df
+        self.wakeup.set()
+
+    def render(self, symbol, df):
+        chart = self.charts.get(symbol)
+        if chart is None:
+            chart = self.charts[symbol] = SymbolChart(symbol)
+        chart.update(df)
+        chart.save(os.path.join(self.output_dir, f'{symbol}_stock_indicators_plot.png'))
+
+    def _due(self, now):
+        """Take the frames that are ready to draw and return when the next one will be."""
+        due = {}
+        next_due = None
+        with self.lock:
+            for symbol in list(self.latest):
+                ready_at = self.last_render.get(symbol, float('-inf')) + self.min_interval
+                if ready_at <= now:
+                    due[symbol] = self.latest.pop(symbol)
+                elif next_due is None or ready_at < next_due:
+                    next_due = ready_at
+        return due, next_due
+
+    def _run(self):
+        while True:
+            self.wakeup.clear()
+            due, next_due = self._due(time.monotonic())
+            for symbol, df in due.items():
+                try:
+                    self.render(symbol, df)
+                except Exception:
+                    traceback.print_exc()
+                self.last_render[symbol] = time.monotonic()
+            if not due:
+                self.wakeup.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
@@ -7,8 +7,9 @@ from datetime import timedelta
 
 import requests
 
-from trading_signals import calculate_technical_indicators, check_rate_limit_tiingo
+from trading_signals import calculate_technical_indicators
 from mplfinance.original_flavor import candlestick_ohlc
+from chart_renderer import CHART_COLUMNS
 
 
 def plot_data(df, symbol, output_dir):
@@ -137,25 +138,28 @@ def get_daily_data(symbol, start_date, end_date, api_key):
     return df
 
 
-symbols = ['NVDA', 'CG', 'LIN', 'AAPL', 'MSFT', 'BSTZ', 'BMEZ', 'BST', 'ARES', 'BME', 'COLD']
+# Plots daily charts of a fixed list of symbols when run as a script; importing
+# plot_data (the bar pipeline does) must not fetch or draw anything
+if __name__ == '__main__':
+    symbols = ['NVDA', 'CG', 'LIN', 'AAPL', 'MSFT', 'BSTZ', 'BMEZ', 'BST', 'ARES', 'BME', 'COLD']
 
-for symbol in symbols:
-    data = get_daily_data(symbol, '2023-05-01', '2023-06-14', TIINGO_API_KEY)
+    for symbol in symbols:
+        data = get_daily_data(symbol, '2023-05-01', '2023-06-14', TIINGO_API_KEY)
 
-    data = calculate_technical_indicators(data)
+        data = calculate_technical_indicators(data, CHART_COLUMNS)
 
-    # data = data[data['sma_200'] != 0.0]
+        # data = data[data['sma_200'] != 0.0]
 
-    #drop divCash
-    data = data.drop(columns=['divCash'])
-    #drop splitFactor
-    data = data.drop(columns=['splitFactor'])
+        #drop divCash
+        data = data.drop(columns=['divCash'])
+        #drop splitFactor
+        data = data.drop(columns=['splitFactor'])
 
-    data = data.drop(columns=['symbol'])
+        data = data.drop(columns=['symbol'])
 
-    # print(data)
-    #plot the data form nvda
-    plot_data(data, symbol, './plots/')
+        # print(data)
+        #plot the data form nvda
+        plot_data(data, symbol, './plots/')
 # # Tiingo API Key
 # TIINGO_API_KEY = os.environ.get("TIINGO_API_KEY")
 
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from indicator_graph import INDICATOR_PARAMS, params_key
+from trading_signals import calculate_technical_indicators, get_tiingo_data
+
+
+# Indicator features are stored per symbol, indicator parameter set and date range:
+#   feature_store/AAPL/<params_key>/2021-01-01_2023-06-01/
+#       meta.json      layout version, parameters, columns and a fingerprint of the bars
+#       index.npy      int64 bar timestamps (ns, UTC)
+#       values.npy     float64 (rows, columns) array in column-major order
+# The arrays are memory-mapped when loaded, so every column is a contiguous
+# read-only slice of the file. An entry is rebuilt when the bars it was
+# computed from, the indicator parameters or the layout change.
+FEATURE_STORE_DIR = os.environ.get("FEATURE_STORE_DIR", "./feature_store")
+FEATURE_STORE_VERSION = 1
+
+
+def _day(value):
+    return f"{pd.Timestamp(value):%Y-%m-%d}"
+
+
+def entry_path(symbol, start_date, end_date, store_dir=FEATURE_STORE_DIR):
+    return os.path.join(store_dir, symbol, params_key(), f"{_day(start_date)}_{_day(end_date)}")
+
+
+def _timestamps(index):
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+
+def fingerprint(bars):
+    """Hash of the bars' timestamps and numeric values."""
+    numeric = bars.select_dtypes('number')
+    digest = hashlib.sha1()
+    digest.update(_timestamps(bars.index).tobytes())
+    digest.update(json.dumps(list(numeric.columns)).encode())
+    digest.update(np.ascontiguousarray(numeric.to_numpy(dtype='f8')).tobytes())
+    return digest.hexdigest()
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_features(path, features, bars_fingerprint):
+    """Store the numeric columns of a feature frame at path, replacing what was there."""
+    numeric = features.select_dtypes('number')
+    index = pd.DatetimeIndex(numeric.index)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'index.npy'), _timestamps(numeric.index))
+    np.save(os.path.join(tmp_path, 'values.npy'), np.asfortranarray(numeric.to_numpy(dtype='f8')))
+    meta = {
+        'version': FEATURE_STORE_VERSION,
+        'params': INDICATOR_PARAMS,
+        'params_key': params_key(),
+        'columns': list(numeric.columns),
+        'tz': str(index.tz) if index.tz is not None else None,
+        'unit': index.unit,
+        'rows': len(numeric),
+        'fingerprint': bars_fingerprint,
+    }
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2, default=list)
+    # Readers never see a half written entry
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(tmp_path, path)
+
+
+def read_features(path, columns=None):
+    """
+    Memory-map a stored entry as a DataFrame, or None if there is none.
+
+    The frame wraps the mapped array without copying it; it is read-only,
+    so use df.copy() (or assign new columns) before modifying values.
+    """
+    meta = _read_meta(path)
+    if meta is None or meta['version'] != FEATURE_STORE_VERSION:
+        return None
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    index = pd.DatetimeIndex(np.load(os.path.join(path, 'index.npy')).view('datetime64[ns]'))
+    if meta['tz'] is not None:
+        index = index.tz_localize('UTC').tz_convert(meta['tz'])
+    index = index.as_unit(meta['unit'])
+    df = pd.DataFrame(values, index=index, columns=meta['columns'], copy=False)
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def load_features(symbol, start_date, end_date, columns=None, store_dir=FEATURE_STORE_DIR):
+    """
+    Indicator features (calculate_technical_indicators without the symbol
+    column) of symbol's bars from start_date to end_date.
+
+    The bars come from get_tiingo_data, which reads the bar cache. The
+    features are served memory-mapped from the store while they were computed
+    from the same bars with the current INDICATOR_PARAMS, and recomputed and
+    stored otherwise. Returns None if there are no bars.
+    """
+    bars = get_tiingo_data(symbol, start_date, end_date)
+    if bars is None or bars.empty:
+        return None
+
+    path = entry_path(symbol, start_date, end_date, store_dir)
+    bars_fingerprint = fingerprint(bars)
+    meta = _read_meta(path)
+    if meta is None or meta['version'] != FEATURE_STORE_VERSION or meta['fingerprint'] != bars_fingerprint:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_features(path, calculate_technical_indicators(bars), bars_fingerprint)
+    return read_features(path, columns)
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+
+# filled_at is the broker's fill time in epoch seconds (None if unknown)
+Fill = namedtuple('Fill', ['order_id', 'symbol', 'side', 'qty', 'price', 'filled_at'], defaults=(None,))
+
+# Seconds an order is waited on before it is given up as not filled
+FILL_TIMEOUT = float(os.environ.get("FILL_TIMEOUT", "60"))
+
+# Trade update events after which an order will never fill
+FAILED_EVENTS = ('canceled', 'rejected', 'expired')
+
+
+class OrderNotFilled(Exception):
+    def __init__(self, order_id, event):
+        super().__init__(f"Order {order_id} was {event}")
+        self.order_id = order_id
+        self.event = event
+
+
+def _epoch(value):
+    # ISO strings in trade updates; REST order entities may hand out timestamps already
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.timestamp()
+
+
+def fill_from_order(order):
+    """Build a Fill from an Alpaca order (entity or trade update dict)."""
+    get = order.get if isinstance(order, dict) else lambda key: getattr(order, key, None)
+    return Fill(
+        order_id=get('id'),
+        symbol=get('symbol'),
+        side=get('side'),
+        qty=float(get('filled_qty') or 0),
+        price=float(get('filled_avg_price') or 0),
+        filled_at=_epoch(get('filled_at')),
+    )
+
+
+class FillTracker:
+    """
+    Tracks order completion from Alpaca's trade_updates stream.
+
+    Call attach(stream) before the stream runs. Waiting on an order then
+    resolves from the fill event instead of polling get_order: wait() blocks
+    the calling thread, wait_async() can be awaited on an event loop, and
+    callbacks added with add_callback run for every fill. Updates that arrive
+    before anyone waits on the order are kept, so submitting an order and
+    then waiting on it cannot miss a fast fill.
+    """
+
+    def __init__(self, keep_recent=1000):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.finished = OrderedDict()
+        self.keep_recent = keep_recent
+        self.callbacks = []
+
+    def attach(self, stream):
+        stream.subscribe_trade_updates(self.handle_trade_update)
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    async def handle_trade_update(self, update):
+        self.process(update.event, update.order)
+
+    def process(self, event, order):
+        if event == 'fill':
+            result = fill_from_order(order)
+        elif event in FAILED_EVENTS:
+            result = OrderNotFilled(order['id'], event)
+        else:
+            # new, partial_fill, accepted, ... do not complete the order
+            return
+
+        with self.lock:
+            future = self.pending.pop(result.order_id, None)
+            if future is None:
+                self.finished[result.order_id] = result
+                while len(self.finished) > self.keep_recent:
+                    self.finished.popitem(last=False)
+
+        if future is not None:
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+        if not isinstance(result, Exception):
+            for callback in self.callbacks:
+                callback(result)
+
+    def future(self, order_id):
+        """concurrent.futures.Future that resolves with the order's Fill."""
+        with self.lock:
+            result = self.finished.pop(order_id, None)
+            if result is None:
+                return self.pending.setdefault(order_id, Future())
+        future = Future()
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        return future
+
+    def forget(self, order_id):
+        with self.lock:
+            self.pending.pop(order_id, None)
+
+    def wait(self, order_id, timeout=None):
+        try:
+            return self.future(order_id).result(timeout)
+        except TimeoutError:
+            self.forget(order_id)
+            raise
+
+    async def wait_async(self, order_id, timeout=None):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(self.future(order_id)), timeout)
+        except asyncio.TimeoutError:
+            self.forget(order_id)
+            raise
+
+
+class FakeTradeUpdateStream:
+    """Local stand-in for the Alpaca stream's trade updates, for tests."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def subscribe_trade_updates(self, handler):
+        self.handlers.append(handler)
+
+    async def send(self, event, order):
+        update = SimpleNamespace(event=event, order=order)
+        for handler in self.handlers:
+            await handler(update)
+
+    def send_sync(self, event, order):
+        asyncio.run(self.send(event, order))
+
+    def fill(self, order_id, symbol, side, qty, price, filled_at=None):
+        """Send a fill event for an order, filled now unless filled_at (a datetime) is given."""
+        filled_at = datetime.now(timezone.utc) if filled_at is None else filled_at
+        self.send_sync('fill', {
+            'id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'status': 'filled',
+            'filled_qty': str(qty),
+            'filled_avg_price': str(price),
+            'filled_at': filled_at.isoformat(),
+        })
@@ -0,0 +1,56 @@
+import os
+import threading
+from collections import OrderedDict
+
+from indicator_graph import params_key
+from trading_signals import calculate_technical_indicators
+
+
+# How many (symbol, last bar, parameters) results are kept
+INDICATOR_CACHE_SIZE = int(os.environ.get("INDICATOR_CACHE_SIZE", "256"))
+
+
+class IndicatorCache:
+    """
+    calculate_technical_indicators results, kept per symbol until a new bar arrives.
+
+    Entries are keyed by (symbol, timestamp of the last bar, indicator
+    parameters, columns), so a refetch that brings no new bar is served
+    without recomputing and a new bar (or changed INDICATOR_PARAMS) misses.
+    The least recently used entries are dropped past maxsize. Returned
+    frames are shared between callers and must not be modified.
+    """
+
+    def __init__(self, maxsize=INDICATOR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, symbol, df, columns=None):
+        last_bar = df.index[-1] if len(df) else None
+        return (symbol, last_bar, params_key(), None if columns is None else tuple(columns))
+
+    def get(self, symbol, df, columns=None):
+        """Indicators for df (the latest bars of symbol), computed only if its last bar is new."""
+        key = self.key(symbol, df, columns)
+        with self.lock:
+            result = self.entries.get(key)
+            if result is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = calculate_technical_indicators(df, columns)
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,141 @@
+import hashlib
+import json
+from collections import namedtuple
+
+import numpy as np
+import talib
+
+from bar_store import BAR_COLUMNS
+from indicator_kernels import CHIKOU_SHIFT, FIB_LEVELS, ICHIMOKU_PERIODS, ICHIMOKU_SHIFT, expanding_max, expanding_min, rolling_max, rolling_min, shift
+from streaming_indicators import INDICATOR_COLUMNS
+
+
+# Price columns the indicators are computed from
+PRICE_COLUMNS = ('high', 'low', 'close')
+
+# A node computes one or more columns from its inputs, which are price columns
+# or columns of other nodes. compute gets the inputs as float64 arrays, in
+# order, and returns one array per output column (a single array if there is
+# only one).
+IndicatorNode = namedtuple('IndicatorNode', ['columns', 'inputs', 'compute'])
+
+
+def _midpoint(period):
+    def compute(high, low):
+        return (rolling_max(high, period) + rolling_min(low, period)) / 2
+    return compute
+
+
+def _fib_level(level):
+    def compute(fib_high, fib_low):
+        return fib_high - (fib_high - fib_low) * level
+    return compute
+
+
+# Every parameter the indicators are computed with. Anything that caches or
+# stores indicator output keys it by params_key(), so changing a value here
+# can never serve results computed with the old one.
+INDICATOR_PARAMS = {
+    'sma_fast': 50,
+    'sma_slow': 200,
+    'bbands_period': 20,
+    'rsi_period': 14,
+    'macd': (12, 26, 9),
+    'stoch': (14, 3, 3),
+    'adx_period': 14,
+    'cci_period': 14,
+    'ichimoku': ICHIMOKU_PERIODS,
+    'ichimoku_shift': ICHIMOKU_SHIFT,
+    'chikou_shift': CHIKOU_SHIFT,
+    'fib_levels': tuple(FIB_LEVELS),
+}
+
+
+def params_key(params=None):
+    """Short stable hash of an indicator parameter set (INDICATOR_PARAMS by default)."""
+    params = INDICATOR_PARAMS if params is None else params
+    encoded = json.dumps(params, sort_keys=True, default=list).encode()
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+_p = INDICATOR_PARAMS
+_conversion, _base, _span_b = _p['ichimoku']
+
+INDICATOR_NODES = [
+    IndicatorNode(('sma_50',), ('close',), lambda close: talib.SMA(close, timeperiod=_p['sma_fast'])),
+    IndicatorNode(('sma_200',), ('close',), lambda close: talib.SMA(close, timeperiod=_p['sma_slow'])),
+    IndicatorNode(('upper_bb', 'middle_bb', 'lower_bb'), ('close',), lambda close: talib.BBANDS(close, timeperiod=_p['bbands_period'])),
+    IndicatorNode(('rsi',), ('close',), lambda close: talib.RSI(close, timeperiod=_p['rsi_period'])),
+    IndicatorNode(('macd', 'macd_signal', 'macd_hist'), ('close',),
+                  lambda close: talib.MACD(close, fastperiod=_p['macd'][0], slowperiod=_p['macd'][1], signalperiod=_p['macd'][2])),
+    IndicatorNode(('slowk', 'slowd'), ('high', 'low', 'close'),
+                  lambda high, low, close: talib.STOCH(high, low, close, fastk_period=_p['stoch'][0], slowk_period=_p['stoch'][1], slowk_matype=0, slowd_period=_p['stoch'][2], slowd_matype=0)),
+    IndicatorNode(('adx',), ('high', 'low', 'close'), lambda high, low, close: talib.ADX(high, low, close, timeperiod=_p['adx_period'])),
+    IndicatorNode(('cci',), ('high', 'low', 'close'), lambda high, low, close: talib.CCI(high, low, close, timeperiod=_p['cci_period'])),
+
+    # Ichimoku cloud
+    IndicatorNode(('tenkan_sen',), ('high', 'low'), _midpoint(_conversion)),
+    IndicatorNode(('kijun_sen',), ('high', 'low'), _midpoint(_base)),
+    IndicatorNode(('senkou_span_a',), ('tenkan_sen', 'kijun_sen'),
+                  lambda tenkan_sen, kijun_sen: shift((tenkan_sen + kijun_sen) / 2, _p['ichimoku_shift'])),
+    IndicatorNode(('senkou_span_b',), ('high', 'low'), lambda high, low: shift(_midpoint(_span_b)(high, low), _p['ichimoku_shift'])),
+    IndicatorNode(('chikou_span',), ('close',), lambda close: shift(close, -_p['chikou_shift'])),
+
+    # Fibonacci retracement levels of the high and low so far
+    IndicatorNode(('fib_high',), ('high',), expanding_max),
+    IndicatorNode(('fib_low',), ('low',), expanding_min),
+] + [IndicatorNode((f'fib_{level}',), ('fib_high', 'fib_low'), _fib_level(level)) for level in _p['fib_levels']]
+
+NODE_BY_COLUMN = {column: node for node in INDICATOR_NODES for column in node.columns}
+
+# Columns whose value at a bar is taken from later bars (chikou_span is the
+# close CHIKOU_SHIFT bars ahead). Fine to plot, but a model fed them sees the future.
+LOOKAHEAD_COLUMNS = ('chikou_span',)
+
+
+class LazyIndicators:
+    """
+    Indicator columns of a price frame, computed on first access.
+
+    lazy['rsi'] computes RSI (and only what it depends on) the first time it
+    is read and keeps the result, so each node runs at most once however
+    many columns are read from it. Values are NaN where the indicator is not
+    defined yet, like the talib output.
+    """
+
+    def __init__(self, df):
+        self.values = {column: df[column].to_numpy(dtype='f8') for column in PRICE_COLUMNS}
+
+    def __contains__(self, column):
+        return column in self.values
+
+    def __getitem__(self, column):
+        if column not in self.values:
+            node = NODE_BY_COLUMN.get(column)
+            if node is None:
+                raise KeyError(f"Unknown indicator column {column!r}")
+            result = node.compute(*(self[name] for name in node.inputs))
+            if len(node.columns) == 1:
+                result = (result,)
+            for name, values in zip(node.columns, result):
+                self.values[name] = np.asarray(values, dtype='f8')
+        return self.values[column]
+
+    def compute(self, columns):
+        """{column: array} for the requested columns."""
+        return {column: self[column] for column in columns}
+
+
+def resolve_columns(columns=None):
+    """
+    The requested indicator columns in INDICATOR_COLUMNS order (all of them
+    for None). The bar's own columns (close, ...) may be listed too and are
+    skipped, so a list of the columns a caller reads can be passed as is.
+    """
+    if columns is None:
+        return list(INDICATOR_COLUMNS)
+    wanted = set(columns) - set(BAR_COLUMNS)
+    unknown = wanted - set(INDICATOR_COLUMNS)
+    if unknown:
+        raise KeyError(f"Unknown indicator columns {sorted(unknown)}")
+    return [column for column in INDICATOR_COLUMNS if column in wanted]
@@ -0,0 +1,175 @@
+import math
+from collections import deque
+
+import numpy as np
+
+
+FIB_LEVELS = [0, 0.236, 0.382, 0.5, 0.618, 0.786, 1]
+
+# chikou_span is the close plotted 22 bars behind, so it is only known 22 bars later
+CHIKOU_SHIFT = 22
+
+# (conversion, base, leading span B) periods, and how far the spans lead
+ICHIMOKU_PERIODS = (9, 26, 52)
+ICHIMOKU_SHIFT = 26
+
+ICHIMOKU_COLUMNS = ['tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou_span']
+FIB_COLUMNS = [f'fib_{level}' for level in FIB_LEVELS]
+
+
+def _rolling_extreme(x, period, ufunc):
+    """
+    Rolling max/min along the first axis in O(n), whatever the period
+    (van Herk / Gil-Werman).
+
+    The series is cut into blocks of `period` values. Every window spans the
+    tail of one block and the head of the next, so its extreme is the larger
+    of a running extreme from the right over the first block and one from the
+    left over the second. The first period - 1 rows are NaN, and a window
+    containing a NaN gives NaN, like pandas' rolling().max().
+    """
+    x = np.asarray(x, dtype='f8')
+    rows = len(x)
+    out = np.full_like(x, np.nan)
+    if rows < period:
+        return out
+    blocks = -(-rows // period)
+    padded = np.full((blocks * period,) + x.shape[1:], np.nan)
+    padded[:rows] = x
+    padded = padded.reshape((blocks, period) + x.shape[1:])
+    from_left = ufunc.accumulate(padded, axis=1).reshape((blocks * period,) + x.shape[1:])
+    from_right = ufunc.accumulate(padded[:, ::-1], axis=1)[:, ::-1].reshape((blocks * period,) + x.shape[1:])
+    # np.maximum/np.minimum propagate NaN, so a NaN anywhere in a window reaches its result
+    out[period - 1:] = ufunc(from_right[:rows - period + 1], from_left[period - 1:rows])
+    return out
+
+
+def rolling_max(x, period):
+    return _rolling_extreme(x, period, np.maximum)
+
+
+def rolling_min(x, period):
+    return _rolling_extreme(x, period, np.minimum)
+
+
+def expanding_max(x):
+    # NaNs are skipped, like rolling(window=len(df), min_periods=1).max()
+    return np.fmax.accumulate(np.asarray(x, dtype='f8'), axis=0)
+
+
+def expanding_min(x):
+    return np.fmin.accumulate(np.asarray(x, dtype='f8'), axis=0)
+
+
+def shift(x, periods):
+    """Shift down (periods > 0) or up (periods < 0) along the first axis, filling with NaN."""
+    x = np.asarray(x, dtype='f8')
+    out = np.full_like(x, np.nan)
+    if periods > 0:
+        out[periods:] = x[:-periods]
+    elif periods < 0:
+        out[:periods] = x[-periods:]
+    else:
+        out[:] = x
+    return out
+
+
+def ichimoku(high, low, close):
+    """
+    All Ichimoku columns in one pass. Works on 1D series or (bars, symbols)
+    panels and returns {column: array} for ICHIMOKU_COLUMNS.
+    """
+    conversion, base, span_b = ICHIMOKU_PERIODS
+    tenkan_sen = (rolling_max(high, conversion) + rolling_min(low, conversion)) / 2
+    kijun_sen = (rolling_max(high, base) + rolling_min(low, base)) / 2
+    return {
+        'tenkan_sen': tenkan_sen,
+        'kijun_sen': kijun_sen,
+        'senkou_span_a': shift((tenkan_sen + kijun_sen) / 2, ICHIMOKU_SHIFT),
+        'senkou_span_b': shift((rolling_max(high, span_b) + rolling_min(low, span_b)) / 2, ICHIMOKU_SHIFT),
+        'chikou_span': shift(close, -CHIKOU_SHIFT),
+    }
+
+
+def fibonacci_levels(high, low):
+    """Fibonacci retracement levels of the high and low so far, as {column: array} for FIB_COLUMNS."""
+    rolling_high = expanding_max(high)
+    diff = rolling_high - expanding_min(low)
+    return {f'fib_{level}': rolling_high - diff * level for level in FIB_LEVELS}
+
+
+class RollingExtreme:
+    """Rolling max (or min) over a fixed window using a monotonic deque."""
+
+    def __init__(self, period, is_max=True):
+        self.period = period
+        self.is_max = is_max
+        self.window = deque()
+        self.count = 0
+
+    def update(self, value):
+        # Drop values that can never be the extreme again
+        if self.is_max:
+            while self.window and self.window[-1][1] <= value:
+                self.window.pop()
+        else:
+            while self.window and self.window[-1][1] >= value:
+                self.window.pop()
+        self.window.append((self.count, value))
+        if self.window[0][0] <= self.count - self.period:
+            self.window.popleft()
+        self.count += 1
+        if self.count < self.period:
+            return None
+        return self.window[0][1]
+
+
+class StreamingIchimoku:
+    """
+    Ichimoku columns updated one bar at a time in O(1).
+
+    update() returns the same values as ichimoku() for the latest bar (None
+    where they are still NaN), except chikou_span, which needs the close
+    CHIKOU_SHIFT bars ahead and is left to the caller.
+    """
+
+    def __init__(self):
+        conversion, base, span_b = ICHIMOKU_PERIODS
+        self.high_conversion = RollingExtreme(conversion, is_max=True)
+        self.low_conversion = RollingExtreme(conversion, is_max=False)
+        self.high_base = RollingExtreme(base, is_max=True)
+        self.low_base = RollingExtreme(base, is_max=False)
+        self.high_span_b = RollingExtreme(span_b, is_max=True)
+        self.low_span_b = RollingExtreme(span_b, is_max=False)
+        self.span_a_lag = deque(maxlen=ICHIMOKU_SHIFT + 1)
+        self.span_b_lag = deque(maxlen=ICHIMOKU_SHIFT + 1)
+
+    def update(self, high, low):
+        high_conversion, low_conversion = self.high_conversion.update(high), self.low_conversion.update(low)
+        high_base, low_base = self.high_base.update(high), self.low_base.update(low)
+        high_span_b, low_span_b = self.high_span_b.update(high), self.low_span_b.update(low)
+        tenkan_sen = (high_conversion + low_conversion) / 2 if high_conversion is not None else None
+        kijun_sen = (high_base + low_base) / 2 if high_base is not None else None
+        self.span_a_lag.append((tenkan_sen + kijun_sen) / 2 if kijun_sen is not None else None)
+        self.span_b_lag.append((high_span_b + low_span_b) / 2 if high_span_b is not None else None)
+        full = len(self.span_a_lag) == ICHIMOKU_SHIFT + 1
+        return {
+            'tenkan_sen': tenkan_sen,
+            'kijun_sen': kijun_sen,
+            'senkou_span_a': self.span_a_lag[0] if full else None,
+            'senkou_span_b': self.span_b_lag[0] if full else None,
+        }
+
+
+class StreamingFibonacci:
+    """Fibonacci levels of the high and low seen so far, updated one bar at a time."""
+
+    def __init__(self):
+        self.high = -math.inf
+        self.low = math.inf
+
+    def update(self, high, low):
+        self.high = max(self.high, high)
+        self.low = min(self.low, low)
+        diff = self.high - self.low
+        return {f'fib_{level}': self.high - diff * level for level in FIB_LEVELS}
@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import threading
+import time
+import traceback
+
+
+# Set LATENCY_METRICS=0 to turn recording off
+LATENCY_ENABLED = os.environ.get("LATENCY_METRICS", "1") != "0"
+# Where the live loop writes its latency snapshot, for api.py's /metrics
+LATENCY_FILE = os.environ.get("LATENCY_FILE", "./metrics/latency.json")
+
+# Buckets are 1/8 of a power of two wide (about 9%), from 1ns to 2**40ns (~18 minutes)
+BUCKETS_PER_DOUBLING = 8
+BUCKET_COUNT = 40 * BUCKETS_PER_DOUBLING + 1
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of durations in nanoseconds."""
+
+    def __init__(self):
+        self.counts = [0] * BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, ns):
+        ns = max(int(ns), 1)
+        bucket = min(int(math.log2(ns) * BUCKETS_PER_DOUBLING), BUCKET_COUNT - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the q-th percentile (never above the max)."""
+        if self.count == 0:
+            return 0
+        rank = math.ceil(self.count * q / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(2 ** ((bucket + 1) / BUCKETS_PER_DOUBLING), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count / 1e6 if self.count else 0.0,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+            'max_ms': self.max / 1e6,
+        }
+
+
+class _Timer:
+    __slots__ = ('recorder', 'stage', 'symbol', 'start')
+
+    def __init__(self, recorder, stage, symbol):
+        self.recorder = recorder
+        self.stage = stage
+        self.symbol = symbol
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.since(self.stage, self.symbol, self.start)
+        return False
+
+
+class LatencyRecorder:
+    """
+    Per-stage, per-symbol latency histograms for the live loop.
+
+    Times are time.perf_counter_ns() values, which can be compared across
+    threads. Stages can be timed with a with block:
+
+        with latency.timer('indicators', symbol):
+            ...
+
+    or, when a stage starts in one place and ends in another, by passing the
+    start time to since(). Recording is a log2 and a few additions under a
+    lock, cheap enough to leave on while trading.
+    """
+
+    def __init__(self, enabled=LATENCY_ENABLED):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.exporter = None
+
+    def record(self, stage, symbol, ns):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get((stage, symbol))
+            if histogram is None:
+                histogram = self.histograms[(stage, symbol)] = LatencyHistogram()
+            histogram.add(ns)
+
+    def since(self, stage, symbol, start_ns):
+        self.record(stage, symbol, time.perf_counter_ns() - start_ns)
+
+    def timer(self, stage, symbol):
+        return _Timer(self, stage, symbol)
+
+    def snapshot(self):
+        """{stage: {symbol: {count, mean_ms, p50_ms, p99_ms, max_ms}}}"""
+        with self.lock:
+            stats = {}
+            for (stage, symbol), histogram in self.histograms.items():
+                stats.setdefault(stage, {})[symbol] = histogram.summary()
+        return {'since': self.started, 'updated': time.time(), 'stages': stats}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.started = time.time()
+
+    def export(self, path=LATENCY_FILE):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, path=LATENCY_FILE, interval=10):
+        """Write the snapshot to path every interval seconds on a daemon thread."""
+        if self.exporter is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.export(path)
+                except Exception:
+                    traceback.print_exc()
+
+        self.exporter = threading.Thread(target=run, name='latency-exporter', daemon=True)
+        self.exporter.start()
+
+
+def read_export(path=LATENCY_FILE):
+    """The last snapshot written by export(), or None if there is none yet."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Shared by the whole process
+latency = LatencyRecorder()
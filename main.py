@@ -1,14 +1,18 @@
-import datetime
 import os
-import time
 from alpaca_trade_api.stream import Stream
 from datetime import date, timedelta
-import numpy as np
 import pandas as pd
-from data_visualization import plot_data
 from portfolio import Portfolio
-import asyncio as asyncio
-from trading_signals import calculate_technical_indicators, check_rate_limit_tiingo, generate_trading_signals, get_tiingo_data
+from streaming_indicators import INDICATOR_COLUMNS, StreamingIndicators
+from bar_store import BAR_COLUMNS, BarRingBuffer
+from tiingo_fetcher import get_universe_data
+from panel_indicators import calculate_technical_indicators_panel
+from order_executor import OrderExecutor
+from fill_tracker import FillTracker
+from bar_pipeline import BarPipeline
+from bar_log import BarLogWriter
+from chart_renderer import ChartRenderer
+from latency import latency
 from config import SYMBOL
 
 
@@ -67,48 +71,12 @@ def execute_scalping_strategy(data, symbol, portfolio):
 
 
 
-def create_bar_handler(historical_data, bar_data, portfolio):
-    async def handle_bar(bar):
+def create_daily_bar_handler(portfolio):
+    async def handle_daily_bar(bar):
+        # Keep the cached market regime current without refetching the daily history
+        portfolio.regime_service.on_daily_bar(bar.symbol, pd.Timestamp(int(bar.timestamp), tz='UTC'), bar.high, bar.low, bar.close)
 
-        timestamp = datetime.datetime.utcfromtimestamp(bar.timestamp / 1e9)  # divide by 1e9 to convert ns to seconds
-        timestamp_str = timestamp.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'  # format as a string
-
-        new_data = pd.DataFrame({
-            'date': [timestamp_str],
-            'open': [bar.open],
-            'high': [bar.high],
-            'low': [bar.low],
-            'close': [bar.close],
-            'symbol': [bar.symbol],
-        })
-        new_data['date'] = pd.to_datetime(new_data['date'])
-        new_data.set_index('date', inplace=True)
-
-        # Check if new_data's index is in historical_data's index
-        if new_data.index[0] in historical_data[bar.symbol].index:
-            # Append unique suffix to avoid overwriting
-            new_data.index = new_data.index + pd.Timedelta(nanoseconds=1)
-
-    
-        bar_data[bar.symbol] = pd.concat([historical_data[bar.symbol], new_data])
-        bar_data[bar.symbol] = calculate_technical_indicators(bar_data[bar.symbol])
-        bar_data[bar.symbol].to_csv(f'data-training/{bar.symbol}_data.csv')
-        #make data_for_plot the most recent 100 rows of bar_data
-        data_for_plot = bar_data[bar.symbol].iloc[-50:]
-        plot_data(data_for_plot, bar.symbol, './plots/')
-
-        data = bar_data[bar.symbol].fillna(0)
-        data = data[data['sma_200'] != 0.0]
-        latest_data = data.iloc[-1:]
-        market_regime = portfolio.get_market_regime(bar.symbol)
-        signals = generate_trading_signals(latest_data, portfolio, market_regime)
-        await asyncio.sleep(1)
-        # execute_scalping_strategy(bar_data[symbol], symbol, portfolio)
-        # execute_scalping_strategy(bar_data[bar.symbol], bar.symbol, portfolio)
-
-        portfolio.execute_trade(bar.symbol, signals['signal'].iloc[-1])
-        
-    return handle_bar
+    return handle_daily_bar
 
 def main():
     alpaca_api_key = os.getenv("APCA_API_KEY")
@@ -116,24 +84,50 @@ def main():
     alpaca_base_url = "https://paper-api.alpaca.markets"
     portfolio = Portfolio(alpaca_api_key, alpaca_secret_key, alpaca_base_url)
     symbols = ['CG', 'LIN', 'AAPL', 'MSFT', 'BSTZ', 'BMEZ', 'BST', 'ARES', 'BME', 'COLD']
-    bar_data = {symbol: pd.DataFrame() for symbol in symbols}
-    historical_data = {symbol: pd.DataFrame() for symbol in symbols}
+    columns = BAR_COLUMNS + INDICATOR_COLUMNS
+    bar_data = {symbol: BarRingBuffer(symbol, columns) for symbol in symbols}
+    # Bars are appended to per-symbol logs; run bar_log.py after the session to build the training CSVs
+    bar_log = BarLogWriter(columns)
+    indicators = {symbol: StreamingIndicators() for symbol in symbols}
     start_date = (date.today() - timedelta(days=14)).strftime('%Y-%m-%d')
     end_date = date.today().strftime('%Y-%m-%d')
+    # Load the whole universe in parallel; the Tiingo rate limit sets the pace
+    universe_data = get_universe_data(symbols, start_date, end_date)
+    loaded = {stock: df for stock, df in universe_data.items() if df is not None}
+    for df in loaded.values():
+        df.index = pd.to_datetime(df.index)
+    # Compute the whole universe's history in one panel pass, then keep the indicators up to date bar by bar
+    warmup = calculate_technical_indicators_panel(loaded)
     for stock in symbols:
-        check_rate_limit_tiingo()
-        df = get_tiingo_data(stock, start_date, end_date)
+        df = universe_data[stock]
         if df is not None:
-            historical_data[stock] = df
+            bar_data[stock] = BarRingBuffer.from_frame(stock, warmup[stock], columns)
+            bar_log.append_frame(stock, bar_data[stock].frame())
+            indicators[stock].prime(df)
     stream = Stream(
         alpaca_api_key,
         alpaca_secret_key,
         base_url=alpaca_base_url,
         data_feed='iex'  # use 'sip' for paid subscription
     )
+    # Order fills are resolved from the trade updates stream instead of polling
+    fill_tracker = FillTracker()
+    fill_tracker.attach(stream)
+    portfolio.attach_fill_tracker(fill_tracker)
+    # Positions are kept current from fills and bars; the broker is only checked to correct drift
+    portfolio.ledger.start_reconciler(portfolio.api)
+    # One worker per symbol, so a slow fill only holds up its own symbol's orders
+    executor = OrderExecutor(portfolio, workers=len(symbols))
+    # Stage latencies are written out periodically; api.py serves them on /metrics
+    latency.start_exporter()
+    # Bars are only queued on the stream's loop; the work runs on the pipeline's pools
+    # Charts are redrawn in place on their own thread, at most every CHART_MIN_INTERVAL seconds
+    renderer = ChartRenderer('./plots/')
+    pipeline = BarPipeline(bar_data, indicators, portfolio, executor, bar_log, renderer)
+    daily_handler = create_daily_bar_handler(portfolio)
     for symbol in symbols:
-        handler = create_bar_handler(historical_data, bar_data, portfolio)
-        stream.subscribe_bars(handler, symbol)
+        stream.subscribe_bars(pipeline.handle_bar, symbol)
+        stream.subscribe_daily_bars(daily_handler, symbol)
 
     stream.run()
 
@@ -0,0 +1,152 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from indicator_kernels import CHIKOU_SHIFT
+
+
+# Rows before the newest bar that can still change when a bar arrives, and
+# the columns that change: chikou_span is the close CHIKOU_SHIFT bars ahead,
+# every other indicator only depends on bars up to its own row. (Moving the
+# start of the fetch window nudges the recursive indicators of old rows in
+# the last digits; those rows are not resent for that.)
+REVISED_ROWS = CHIKOU_SHIFT
+REVISED_COLUMNS = ['chikou_span']
+
+
+def epoch_ms(index):
+    """Timestamps of a DatetimeIndex as milliseconds since the epoch (UTC)."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    return ((index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)).tolist()
+
+
+def _json_values(values):
+    # NaN and inf are not JSON (JSON.parse rejects them); send null like to_json() did
+    result = values.to_numpy(dtype=object)
+    if pd.api.types.is_float_dtype(values.dtype):
+        result[~np.isfinite(values.to_numpy(dtype='f8'))] = None
+    else:
+        result[values.isna().to_numpy()] = None
+    return result.tolist()
+
+
+def encode_rows(df):
+    """
+    Columnar encoding of df: {"index": [ms timestamps], "columns": {name: [values]}}.
+
+    Column names are sent once per message instead of once per row, as
+    to_json() does. Missing values are null.
+    """
+    return {
+        'index': epoch_ms(df.index),
+        'columns': {column: _json_values(df[column]) for column in df.columns},
+    }
+
+
+class MarketFeed:
+    """
+    Turns successive indicator frames per symbol into websocket messages.
+
+    update(symbol, df) returns a delta holding only the rows that are new or
+    changed since the symbol's previous frame, or None when nothing changed.
+    Only the newest bars and the REVISED_ROWS before them are compared, so
+    the work and the message size follow the number of new bars, not the
+    length of the history. snapshot(symbol) returns the whole latest frame
+    for a client that has just subscribed.
+
+    Messages carry a per-symbol seq. A delta applies on top of seq - 1 only;
+    a client that sees a gap asks for a new snapshot. A delta's start is the
+    first timestamp still in the window, and older rows should be dropped.
+    """
+
+    def __init__(self):
+        self.frames = {}
+        self.seqs = {}
+        self.lock = threading.Lock()
+
+    def update(self, symbol, df):
+        with self.lock:
+            previous = self.frames.get(symbol)
+            if previous is df:
+                return None
+            rows = self._changed_rows(previous, df)
+            self.frames[symbol] = df
+            if rows is not None and rows.empty:
+                return None
+            seq = self.seqs[symbol] = self.seqs.get(symbol, 0) + 1
+
+        if rows is None:
+            # Nothing to diff against (or the history itself changed)
+            return {'symbol': symbol, 'type': 'snapshot', 'seq': seq, 'data': encode_rows(df)}
+        return {
+            'symbol': symbol,
+            'type': 'delta',
+            'seq': seq,
+            'start': epoch_ms(df.index[:1])[0],
+            'data': encode_rows(rows),
+        }
+
+    def snapshot(self, symbol):
+        with self.lock:
+            df = self.frames.get(symbol)
+            seq = self.seqs.get(symbol, 0)
+        if df is None:
+            return None
+        return {'symbol': symbol, 'type': 'snapshot', 'seq': seq, 'data': encode_rows(df)}
+
+    def snapshots(self, symbols=None):
+        with self.lock:
+            symbols = list(self.frames) if symbols is None else symbols
+        return [message for message in map(self.snapshot, symbols) if message is not None]
+
+    def _changed_rows(self, previous, df):
+        """The new and revised rows of df, or None if it cannot be sent as a delta."""
+        if previous is None or previous.empty or df.empty or list(previous.columns) != list(df.columns):
+            return None
+        new_from = df.index.searchsorted(previous.index[-1], side='right')
+        if new_from == 0:
+            return None
+        revised_from = max(0, new_from - REVISED_ROWS - 1)
+        overlap = df.iloc[revised_from:new_from]
+        sent = previous.iloc[len(previous) - len(overlap):]
+        if not sent.index.equals(overlap.index):
+            return None
+        columns = [column for column in REVISED_COLUMNS if column in df.columns]
+        sent, overlap_values = sent[columns], overlap[columns]
+        changed = (sent.ne(overlap_values) & ~(sent.isna() & overlap_values.isna())).any(axis=1).to_numpy()
+        return pd.concat([overlap[changed], df.iloc[new_from:]])
+
+
+def market_data_room(symbol):
+    """Socket.IO room of the clients watching symbol."""
+    return f'market_data:{symbol}'
+
+
+class Subscriptions:
+    """
+    The symbols each websocket client watches, so the refresher only fetches,
+    computes and sends the symbols someone is watching.
+    """
+
+    def __init__(self):
+        self.by_client = {}
+        self.lock = threading.Lock()
+
+    def add(self, client, symbols):
+        with self.lock:
+            self.by_client.setdefault(client, set()).update(symbols)
+
+    def remove(self, client, symbols=None):
+        """Drop some of client's symbols, or all of them (when it disconnects)."""
+        with self.lock:
+            watched = self.by_client.get(client, set())
+            watched.difference_update(watched.copy() if symbols is None else symbols)
+            if not watched:
+                self.by_client.pop(client, None)
+
+    def symbols(self):
+        with self.lock:
+            return set().union(*self.by_client.values())
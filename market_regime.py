@@ -0,0 +1,165 @@
+import bisect
+import math
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from streaming_indicators import RollingSum, StreamingAdx, StreamingAtr
+
+
+class RegimeState:
+    """Daily SMA / ADX / ATR state for one symbol, updated one daily bar at a time."""
+
+    def __init__(self, short_period=10, long_period=20, adx_period=14, atr_period=14):
+        self.short_period = short_period
+        self.long_period = long_period
+        self.short_sma = RollingSum(short_period)
+        self.long_sma = RollingSum(long_period)
+        self.adx = StreamingAdx(adx_period)
+        self.atr = StreamingAtr(atr_period)
+        # Every ATR value seen so far, kept sorted for the median
+        self.atr_history = []
+        self.last_date = None
+        self.last_short = None
+        self.last_long = None
+        self.last_adx = None
+        self.last_atr = None
+
+    def update(self, day, high, low, close):
+        # Daily bars that were already applied (e.g. seen on the stream and then fetched) are ignored
+        if self.last_date is not None and day <= self.last_date:
+            return
+        self.last_date = day
+        high, low, close = float(high), float(low), float(close)
+
+        total = self.short_sma.update(close)
+        self.last_short = total / self.short_period if total is not None else None
+        total = self.long_sma.update(close)
+        self.last_long = total / self.long_period if total is not None else None
+        self.last_adx = self.adx.update(high, low, close)
+        self.last_atr = self.atr.update(high, low, close)
+        if self.last_atr is not None:
+            bisect.insort(self.atr_history, self.last_atr)
+
+    def median_atr(self):
+        values = self.atr_history
+        if not values:
+            return math.nan
+        middle = len(values) // 2
+        if len(values) % 2:
+            return values[middle]
+        return (values[middle - 1] + values[middle]) / 2
+
+    def regime(self):
+        if self.last_short is None or self.last_long is None:
+            sma_trend = 0
+        else:
+            sma_trend = int(self.last_short > self.last_long) - int(self.last_short < self.last_long)
+        adx = self.last_adx if self.last_adx is not None else math.nan
+        atr = self.last_atr if self.last_atr is not None else math.nan
+        atr_threshold = 1.5 * self.median_atr()
+
+        if sma_trend > 0 and adx > 25:
+            return 'bullish'
+        elif sma_trend < 0 and adx > 25:
+            return 'bearish'
+        elif atr < atr_threshold:
+            return 'low_volatility'
+        else:
+            return 'high_volatility'
+
+
+def _to_trading_day(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None or timestamp == timestamp.normalize():
+        # Date-only stamps (Tiingo's daily bars are UTC midnight) already name the day
+        return timestamp.date()
+    # Intraday stamps, e.g. Alpaca's daily bars at midnight New York time given in UTC
+    return timestamp.tz_convert('America/New_York').date()
+
+
+def _trading_today():
+    return pd.Timestamp.now(tz='America/New_York').date()
+
+
+class MarketRegimeService:
+    """
+    Serves each symbol's market regime from memory.
+
+    The regime only depends on daily bars, so it is computed once per trading
+    day. The first lookup for a symbol downloads its daily history; after that
+    only the days that are missing are fetched, and daily bars from the stream
+    can be passed to on_daily_bar.
+
+    Only completed daily bars are applied: fetched bars for the current
+    trading day are skipped, and a streamed bar is held (later updates of
+    the same day replace it) until a bar of a later day or a lookup on a
+    later day shows it was final.
+
+    fetch_daily(symbol, period, start_date) must return a DataFrame of daily
+    bars indexed by date with high, low and close columns (or None).
+    """
+
+    def __init__(self, fetch_daily, short_period=10, long_period=20, adx_period=14, atr_period=14, history_days=1000):
+        self.fetch_daily = fetch_daily
+        self.params = (short_period, long_period, adx_period, atr_period)
+        self.required_period = max(long_period, adx_period, atr_period) + history_days
+        self.states = {}
+        self.regimes = {}
+        # The latest streamed bar per symbol, not applied until it is complete
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get_regime(self, symbol):
+        today = datetime.now().date()
+        with self.lock:
+            cached = self.regimes.get(symbol)
+            if cached is not None and cached[0] == today:
+                return cached[1]
+            state = self.states.get(symbol)
+            start_date = state.last_date if state is not None else None
+
+        # The HTTP request runs without the lock so other lookups and the stream are not held up
+        market_data = self.fetch_daily(symbol, self.required_period, start_date)
+
+        with self.lock:
+            return self._apply_history(symbol, market_data, today)
+
+    def on_daily_bar(self, symbol, timestamp, high, low, close):
+        """Take a daily bar from the stream (e.g. the Alpaca daily bar stream)."""
+        day = _to_trading_day(timestamp)
+        with self.lock:
+            state = self.states.get(symbol)
+            if state is None:
+                # Nothing to build on yet; the next lookup loads the full history
+                return
+            pending = self.pending.get(symbol)
+            if pending is not None and pending[0] < day:
+                # A bar of a later day means the held one was final
+                state.update(*pending)
+                self.regimes[symbol] = (datetime.now().date(), state.regime())
+            self.pending[symbol] = (day, high, low, close)
+
+    def _apply_history(self, symbol, market_data, today):
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = RegimeState(*self.params)
+
+        trading_today = _trading_today()
+        if market_data is not None:
+            for day, high, low, close in zip(market_data.index, market_data['high'], market_data['low'], market_data['close']):
+                day = _to_trading_day(day)
+                # Today's bar is still being filled in
+                if day < trading_today:
+                    state.update(day, high, low, close)
+
+        # A held streamed bar of an earlier day is complete; fetched bars win if they covered it
+        pending = self.pending.get(symbol)
+        if pending is not None and pending[0] < trading_today:
+            state.update(*pending)
+            del self.pending[symbol]
+
+        regime = state.regime()
+        self.regimes[symbol] = (today, regime)
+        return regime
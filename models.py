@@ -1,84 +1,179 @@
+import numpy as np
+
+# Forward horizons, in bars, labelled by create_horizon_labels
+LABEL_HORIZONS = (1, 5, 15, 60)
+# Trailing window of the std that separates "a lot" from "a little" (one trading day of minute bars)
+LABEL_STD_WINDOW = 390
+# Label of the last bars of a horizon, whose future is not known yet
+LABEL_MISSING = -128
+
+
+def _label_changes(diff, std):
+    # Same order of tests as the original loop; NaN changes fall through to -1 like it did
+    labels = np.full(len(diff), -1, dtype=np.int8)  # 'price went down a little'
+    with np.errstate(invalid='ignore'):
+        labels[diff > 0] = 1  # 'price went up a little'
+        labels[diff > std] = 2  # 'price went up a lot'
+        labels[diff == 0] = 0  # 'price stayed the same'
+        labels[diff < -std] = -2  # 'price went down a lot'
+    return labels
+
+
 # define a function to create labels
 def create_labels(df, col_name):
     """Creates a label for the price difference."""
-    # create a list to keep the labels
-    labels = []
-    # get the price differences
-    diff = df[col_name].diff()
-    for d in diff:
-        if d > df[col_name].std():
-            labels.append(2)  # 'price went up a lot'
-        elif d > 0:
-            labels.append(1)  # 'price went up a little'
-        elif d == 0:
-            labels.append(0)  # 'price stayed the same'
-        elif d < -df[col_name].std():
-            labels.append(-2)  # 'price went down a lot'
-        else:
-            labels.append(-1)  # 'price went down a little'
+    # The std of the whole column is computed once, not once per row
+    prices = df[col_name].astype('f8')
+    return _label_changes(prices.diff().to_numpy(), prices.std())
+
+
+def create_horizon_labels(df, col_name='close', horizons=LABEL_HORIZONS, std_window=LABEL_STD_WINDOW):
+    """
+    Labels of the price change over the next h bars for every horizon h,
+    as {f'label_{h}': int8 array}.
+
+    The labels are create_labels' -2..2, against the std of the prices over
+    the std_window bars up to each row, so they do not look ahead (with
+    std_window=None the std of the whole column is used, like create_labels).
+    The last h rows of a horizon, and the rows before the rolling std has a
+    full window, are LABEL_MISSING.
+    """
+    prices = df[col_name].astype('f8')
+    values = prices.to_numpy()
+    if std_window is None:
+        std = prices.std()
+        warm_up = np.zeros(len(values), dtype=bool)
+    else:
+        std = prices.rolling(std_window).std().to_numpy()
+        # No std yet, so these rows could never be told apart as "a lot"
+        warm_up = np.isnan(std)
+    labels = {}
+    for horizon in horizons:
+        change = np.full(len(values), np.nan)
+        change[:-horizon] = values[horizon:] - values[:-horizon]
+        horizon_labels = _label_changes(change, std)
+        horizon_labels[np.isnan(change) | warm_up] = LABEL_MISSING
+        labels[f'label_{horizon}'] = horizon_labels
     return labels
 
 # Load sklearn libraries
 import datetime
+import os
 import joblib
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 from datetime import timezone
 
 
-from trading_signals import calculate_technical_indicators, get_tiingo_data
-
-def train_model(symbols, start_date, end_date):
-    # Create a dictionary to store models for each symbol
-    models = {}
-
-    for symbol in symbols:
-        df = get_tiingo_data(symbol, start_date, end_date)
-
-        df = calculate_technical_indicators(df)
-        df.to_csv(f'./data-training/{symbol}_trading_data.csv')
-        #drop symbol 
-        df = df.drop(columns=['symbol'])
-        df['labels'] = create_labels(df, 'close')
-        df.fillna(0, inplace=True)
-
-        # Define feature columns and target column
-        features = df.drop(columns=['labels'])
-        target = df['labels']
-
-        # Split the data into train and test datasets
-        X_train, X_test, y_train, y_test = train_test_split(features, target, test_size=0.2, random_state=42)
-
-        # Create the classifier and fit it to our training data
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(X_train, y_train)
-
-        # Use the fitted model to make predictions on the test data and evaluate the model
-        y_pred = model.predict(X_test)
-        print(classification_report(y_test, y_pred))
-        print(confusion_matrix(y_test, y_pred))
-
-        # Save the model into the models dictionary
-        models[symbol] = model
-        # Save the model to disk
-        joblib.dump(model, f'./models/{symbol}_model.pkl')
-
-    # Return the dictionary of trained models
-    return models
-
-
-
-
-    
-
-# Call the function
-# fetch_stock_data('AAPL', get_tiingo_data)  # Uncomment this line if you want to run the function
-
-symbols = ['BP', 'NTR', 'CTRA', 'KMI', 'CNX', 'NFG', 'ZG']
-start_date = datetime.datetime(2021, 1, 1)
-end_date = datetime.datetime(2023, 6, 1)
+import trading_signals
+from rate_limit import TokenBucket
+from feature_store import load_features
+from indicator_graph import LOOKAHEAD_COLUMNS
+
+# Where fitted models and the training data are written
+MODEL_DIR = os.environ.get("MODEL_DIR", "./models/")
+TRAINING_DATA_DIR = os.environ.get("TRAINING_DATA_DIR", "./data-training/")
+# Share of the newest rows held out for evaluation
+TEST_SIZE = 0.2
+# Symbols trained at the same time; each worker holds one symbol's data and model
+TRAIN_WORKERS = int(os.environ.get("TRAIN_WORKERS", str(os.cpu_count() or 1)))
+
+
+def train_symbol(symbol, start_date, end_date, model_dir=MODEL_DIR):
+    """Fit, evaluate and save one symbol's model. Returns the model's path, or None without data."""
+    # Indicator features from the feature store, computed only if the bars or parameters changed
+    df = load_features(symbol, start_date, end_date)
+    if df is None:
+        return None
+
+    df.to_csv(os.path.join(TRAINING_DATA_DIR, f'{symbol}_trading_data.csv'))
+    # Columns computed from later bars would hand the model its own labels
+    df = df.drop(columns=[column for column in LOOKAHEAD_COLUMNS if column in df.columns])
+    df = df.fillna(0)
+
+    # One target per forward horizon; rows missing any of them (the std warm-up
+    # and the last bars, whose future is unknown) are not trained on
+    target = pd.DataFrame(create_horizon_labels(df, 'close'), index=df.index)
+    known = (target != LABEL_MISSING).all(axis=1).to_numpy()
+    features = df[known]
+    target = target[known]
+
+    # Split by time: test on the newest rows, and leave out the longest horizon's
+    # worth of rows before them, whose labels look into the test period
+    split = int(len(features) * (1 - TEST_SIZE))
+    train_end = max(0, split - max(LABEL_HORIZONS))
+    X_train, y_train = features.iloc[:train_end], target.iloc[:train_end]
+    X_test, y_test = features.iloc[split:], target.iloc[split:]
+    if X_train.empty or X_test.empty:
+        return None
+
+    # Create the classifier and fit it to our training data; a random forest
+    # predicts every horizon at once with one set of trees
+    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model.fit(X_train, y_train)
+
+    # Use the fitted model to make predictions on the test data and evaluate the model
+    y_pred = model.predict(X_test)
+    for i, column in enumerate(target.columns):
+        print(f"{symbol} {column}:")
+        print(classification_report(y_test[column], y_pred[:, i]))
+        print(confusion_matrix(y_test[column], y_pred[:, i]))
+
+    # Save the model to disk
+    path = os.path.join(model_dir, f'{symbol}_model.pkl')
+    joblib.dump(model, path)
+    return path
+
+
+def _init_worker(workers):
+    # The Tiingo limit is per process, so each worker gets its share of it
+    trading_signals.tiingo_rate_limit = TokenBucket(
+        trading_signals.TIINGO_REQUESTS_PER_MINUTE / 60 / workers,
+        max(1, trading_signals.TIINGO_BURST // workers),
+    )
+
+
+def train_model(symbols, start_date, end_date, workers=TRAIN_WORKERS, model_dir=MODEL_DIR):
+    """
+    Train every symbol once, in parallel on a process pool.
+
+    Each model is written to model_dir as soon as its symbol finishes, and
+    only its path comes back to this process, so memory is bounded by the
+    workers' symbols rather than the universe. Returns {symbol: model path}
+    for the symbols that were trained.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    os.makedirs(TRAINING_DATA_DIR, exist_ok=True)
+    symbols = list(dict.fromkeys(symbols))
+    workers = max(1, min(workers, len(symbols)))
+
+    paths = {}
+    # A fresh process per symbol hands its memory back to the system once the symbol is done
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(workers,),
+                             max_tasks_per_child=1) as pool:
+        futures = {pool.submit(train_symbol, symbol, start_date, end_date, model_dir): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                path = future.result()
+            except Exception as e:
+                print(f"Training failed for {symbol}: {e}")
+                continue
+            if path is None:
+                print(f"No data to train {symbol}")
+            else:
+                print(f"Saved {symbol} model to {path}")
+                paths[symbol] = path
+
+    # Return the paths of the trained models
+    return paths
+
+
+if __name__ == '__main__':
+    symbols = ['BP', 'NTR', 'CTRA', 'KMI', 'CNX', 'NFG', 'ZG']
+    start_date = datetime.datetime(2021, 1, 1)
+    end_date = datetime.datetime(2023, 6, 1)
 
-for symbol in symbols:
     models = train_model(symbols, start_date, end_date)
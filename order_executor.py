@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from fill_tracker import FILL_TIMEOUT
+from latency import latency
+
+
+TRADE_SIGNALS = ('buy', 'sell', 'short', 'cover')
+
+# Seconds an intent may wait in its queue before it is dropped as stale. A
+# trade holds its worker for up to FILL_TIMEOUT plus execute_trade's sleeps,
+# so this has to be longer than that, or an intent queued behind a slow fill
+# would always be dropped.
+ORDER_MAX_AGE = float(os.environ.get("ORDER_MAX_AGE", str(FILL_TIMEOUT + 30)))
+
+
+class OrderExecutor:
+    """
+    Order queue that keeps broker calls off the bar stream's event loop.
+
+    The bar handler calls submit(symbol, signal), which only puts the intent
+    on a queue and returns. Worker tasks take intents off the queues and run
+    portfolio.execute_trade on a thread pool, so order submission, sleeps and
+    fill waits never hold up bar processing for other symbols.
+
+    A symbol is always handled by the same worker, so its trades run in the
+    order they were signalled. A worker blocks for as long as its trade waits
+    for a fill, so give the executor one worker per symbol
+    (workers=len(symbols)); with fewer, a slow fill holds up the other
+    symbols sharing its worker. Intents that waited longer than max_age
+    seconds are dropped, since the signal that produced them is stale by then.
+
+    The time intents spend queued is recorded as the 'order_queue' latency
+    stage. When submit is given the bar's arrival time, the time from the
+    bar arriving to execute_trade returning is recorded as 'bar_to_trade'.
+    """
+
+    def __init__(self, portfolio, workers, max_age=ORDER_MAX_AGE):
+        self.portfolio = portfolio
+        self.workers = workers
+        self.max_age = max_age
+        self.queues = None
+        self.tasks = []
+        self.assignments = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='order-worker')
+
+    def start(self):
+        # Needs a running loop, so it is started lazily from the first submit
+        loop = asyncio.get_running_loop()
+        self.queues = [asyncio.Queue() for _ in range(self.workers)]
+        self.tasks = [loop.create_task(self._worker(queue)) for queue in self.queues]
+
+    def submit(self, symbol, signal, received=None):
+        """
+        Queue a trade without waiting for it. Returns False if there is nothing to do.
+        received is the time.perf_counter_ns() at which the bar behind the signal arrived.
+        """
+        if signal not in TRADE_SIGNALS:
+            return False
+        if self.queues is None:
+            self.start()
+        worker = self.assignments.setdefault(symbol, len(self.assignments) % self.workers)
+        self.queues[worker].put_nowait((symbol, signal, time.perf_counter_ns(), received))
+        return True
+
+    async def join(self):
+        """Wait until every queued intent has been processed."""
+        if self.queues is not None:
+            await asyncio.gather(*(queue.join() for queue in self.queues))
+
+    async def _worker(self, queue):
+        loop = asyncio.get_running_loop()
+        while True:
+            symbol, signal, submitted, received = await queue.get()
+            try:
+                latency.since('order_queue', symbol, submitted)
+                age = (time.perf_counter_ns() - submitted) / 1e9
+                if age > self.max_age:
+                    print(f"Dropping stale {signal} for {symbol} ({age:.1f}s old).")
+                    continue
+                await loop.run_in_executor(self.pool, self.portfolio.execute_trade, symbol, signal)
+                if received is not None:
+                    latency.since('bar_to_trade', symbol, received)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                queue.task_done()
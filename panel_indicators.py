@@ -0,0 +1,294 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from indicator_graph import resolve_columns
+from indicator_kernels import FIB_COLUMNS, ICHIMOKU_COLUMNS, fibonacci_levels, ichimoku, rolling_max, rolling_min, shift
+from streaming_indicators import EPSILON
+
+
+# A panel holds one column per symbol and one row per bar. Rows are aligned by
+# position, not by timestamp: row i is each symbol's i-th bar, and symbols
+# with fewer bars are padded with NaN at the end. The indicators only depend
+# on bar order, so every column gives exactly what calculate_technical_indicators
+# gives for that symbol on its own, however the symbols' timestamps line up.
+
+
+def make_panel(frames, columns=('open', 'high', 'low', 'close', 'volume')):
+    """
+    Stack per-symbol frames into panels.
+
+    Returns (symbols, indexes, panels) where panels maps each column to a
+    (bars, symbols) float64 array and indexes keeps each symbol's index so
+    split_panel can rebuild the frames.
+    """
+    symbols = list(frames)
+    indexes = [frames[symbol].index for symbol in symbols]
+    rows = max((len(index) for index in indexes), default=0)
+    panels = {}
+    for column in columns:
+        panel = np.full((rows, len(symbols)), np.nan)
+        for i, symbol in enumerate(symbols):
+            values = frames[symbol][column].to_numpy(dtype='f8')
+            panel[:len(values), i] = values
+        panels[column] = panel
+    return symbols, indexes, panels
+
+
+def split_panel(symbols, indexes, panels, frames=None):
+    """
+    Turn panels back into one DataFrame per symbol.
+
+    With frames given, the panel columns are added to a copy of each symbol's
+    frame, the way calculate_technical_indicators adds them.
+    """
+    result = {}
+    for i, symbol in enumerate(symbols):
+        rows = len(indexes[i])
+        values = {column: panel[:rows, i] for column, panel in panels.items()}
+        if frames is None:
+            result[symbol] = pd.DataFrame(values, index=indexes[i])
+        else:
+            df = frames[symbol]
+            new = pd.DataFrame(values, index=df.index)
+            if df.columns.intersection(new.columns).empty:
+                # One concat instead of a column insert per indicator
+                df = pd.concat([df, new], axis=1)
+            else:
+                df = df.copy()
+                for column, column_values in values.items():
+                    df[column] = column_values
+            result[symbol] = df
+    return result
+
+
+def _sma(x, period):
+    out = np.full_like(x, np.nan)
+    if len(x) >= period:
+        # Running sums, like talib: one add and one subtract per bar whatever the period
+        missing = np.isnan(x)
+        total = np.cumsum(np.where(missing, 0.0, x), axis=0)
+        count = np.cumsum(missing, axis=0)
+        out[period - 1:] = total[period - 1:]
+        out[period:] -= total[:-period]
+        out[period - 1:] /= period
+        # Windows that include a NaN (e.g. an input's warmup) stay NaN
+        gaps = count[period - 1:].copy()
+        gaps[1:] -= count[:-period]
+        out[period - 1:][gaps > 0] = np.nan
+    return out
+
+
+def _window_mean(x, period):
+    # Sums each window directly: no cancellation error, for short periods
+    out = np.full_like(x, np.nan)
+    if len(x) >= period:
+        out[period - 1:] = sliding_window_view(x, period, axis=0).sum(axis=-1) / period
+    return out
+
+
+def _recursive(x, decay, gain, seed, start):
+    """
+    y[t] = decay * y[t - 1] + gain * x[t] for t > start, with y[start] = seed,
+    run down every column at once. Rows before start are NaN.
+    """
+    out = np.full_like(x, np.nan)
+    if len(x) > start:
+        out[start] = seed
+        if len(x) > start + 1:
+            out[start + 1:] = lfilter([gain], [1.0, -decay], x[start + 1:], axis=0, zi=(decay * seed)[np.newaxis, :])[0]
+    return out
+
+
+def _ema(x, period, start):
+    """talib EMA of x[start:], seeded with the SMA of its first `period` values."""
+    k = 2.0 / (period + 1)
+    seed_at = start + period - 1
+    if len(x) <= seed_at:
+        return np.full_like(x, np.nan)
+    return _recursive(x, 1.0 - k, k, x[start:seed_at + 1].mean(axis=0), seed_at)
+
+
+def _shifted_variance(x, period):
+    # Variance of each window relative to its first value, like talib: no
+    # cancellation error, and exactly 0 for a flat window
+    out = np.full_like(x, np.nan)
+    if len(x) >= period:
+        windows = sliding_window_view(x, period, axis=0)
+        deviations = windows - windows[..., :1]
+        mean = deviations.sum(axis=-1) / period
+        out[period - 1:] = (deviations * deviations).sum(axis=-1) / period - mean * mean
+    return out
+
+
+def _bbands(close, period=20, deviations=2.0):
+    middle = _window_mean(close, period)
+    variance = _shifted_variance(close, period)
+    std_dev = np.sqrt(np.where(variance > 0.0, variance, 0.0))
+    std_dev[np.isnan(variance)] = np.nan
+    return middle + deviations * std_dev, middle, middle - deviations * std_dev
+
+
+def _rsi(close, period=14):
+    rsi = np.full_like(close, np.nan)
+    if len(close) <= period:
+        return rsi
+    change = np.diff(close, axis=0, prepend=np.nan)
+    gain = np.where(change > 0, change, 0.0)
+    loss = np.where(change < 0, -change, 0.0)
+    # Wilder smoothing seeded with the mean of the first `period` changes
+    avg_gain = _recursive(gain, (period - 1) / period, 1.0 / period, gain[1:period + 1].mean(axis=0), period)
+    avg_loss = _recursive(loss, (period - 1) / period, 1.0 / period, loss[1:period + 1].mean(axis=0), period)
+    total = avg_gain + avg_loss
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi[period:] = np.where(np.abs(total[period:]) < EPSILON, 0.0, 100.0 * avg_gain[period:] / total[period:])
+    return rsi
+
+
+def _macd(close, fast=12, slow=26, signal=9):
+    macd = np.full_like(close, np.nan)
+    macd_signal = np.full_like(close, np.nan)
+    seed_at = slow - 1
+    if len(close) <= seed_at:
+        return macd, macd_signal, macd
+    # talib seeds both EMAs on the bar where the slow one is ready
+    slow_k = 2.0 / (slow + 1)
+    fast_k = 2.0 / (fast + 1)
+    ema_slow = _recursive(close, 1.0 - slow_k, slow_k, close[:slow].mean(axis=0), seed_at)
+    ema_fast = _recursive(close, 1.0 - fast_k, fast_k, close[slow - fast:slow].mean(axis=0), seed_at)
+    line = ema_fast - ema_slow
+    signal_line = _ema(line, signal, seed_at)
+    ready = seed_at + signal - 1
+    macd[ready:] = line[ready:]
+    macd_signal[ready:] = signal_line[ready:]
+    return macd, macd_signal, macd - macd_signal
+
+
+def _stoch(high, low, close, fastk_period=14, slowk_period=3, slowd_period=3):
+    highest = rolling_max(high, fastk_period)
+    lowest = rolling_min(low, fastk_period)
+    diff = (highest - lowest) / 100.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fastk = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+    fastk[np.isnan(highest)] = np.nan
+    slowk = _sma(fastk, slowk_period)
+    slowd = _sma(slowk, slowd_period)
+    slowk[np.isnan(slowd)] = np.nan
+    return slowk, slowd
+
+
+def _adx(high, low, close, period=14):
+    rows = len(close)
+    adx = np.full_like(close, np.nan)
+    if rows < 2 * period:
+        return adx
+
+    diff_plus = high - shift(high, 1)
+    diff_minus = shift(low, 1) - low
+    prev_close = shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    minus_dm = np.where((diff_minus > 0) & (diff_plus < diff_minus), diff_minus, 0.0)
+    plus_dm = np.where((diff_plus > 0) & (diff_plus > diff_minus), diff_plus, 0.0)
+
+    # The first period - 1 moves are summed, then Wilder smoothing: x - x / period + new
+    decay = 1.0 - 1.0 / period
+    plus_sm = _recursive(plus_dm, decay, 1.0, plus_dm[1:period].sum(axis=0), period - 1)
+    minus_sm = _recursive(minus_dm, decay, 1.0, minus_dm[1:period].sum(axis=0), period - 1)
+    tr_sm = _recursive(true_range, decay, 1.0, true_range[1:period].sum(axis=0), period - 1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        minus_di = 100.0 * (minus_sm / tr_sm)
+        plus_di = 100.0 * (plus_sm / tr_sm)
+        total = minus_di + plus_di
+        dx = 100.0 * (np.abs(minus_di - plus_di) / total)
+    # talib skips bars where the range or the DI sum is zero
+    dx[(np.abs(tr_sm) < EPSILON) | (np.abs(total) < EPSILON)] = np.nan
+    dx[:period] = np.nan
+
+    seed_at = 2 * period - 1
+    value = np.nansum(dx[period:seed_at + 1], axis=0) / period
+    adx[seed_at] = value
+    valid = ~np.isnan(close)
+    if not (np.isnan(dx[seed_at + 1:]) & valid[seed_at + 1:]).any():
+        adx[seed_at:] = _recursive(dx, (period - 1) / period, 1.0 / period, value, seed_at)[seed_at:]
+        return adx
+    # A skipped bar keeps the previous value, which a linear filter cannot do
+    for t in range(seed_at + 1, rows):
+        value = np.where(np.isnan(dx[t]), value, (value * (period - 1) + dx[t]) / period)
+        adx[t] = value
+    return adx
+
+
+def _cci(high, low, close, period=14):
+    cci = np.full_like(close, np.nan)
+    if len(close) < period:
+        return cci
+    typical = (high + low + close) / 3
+    windows = sliding_window_view(typical, period, axis=0)
+    # Relative to each window's first value, so a flat window averages to exactly that value
+    average = windows[..., 0] + (windows - windows[..., :1]).sum(axis=-1) / period
+    mean_dev = np.abs(windows - average[..., np.newaxis]).sum(axis=-1)
+    diff = typical[period - 1:] - average
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cci[period - 1:] = np.where((diff != 0.0) & (mean_dev != 0.0), diff / (0.015 * (mean_dev / period)), 0.0)
+    cci[period - 1:][np.isnan(average)] = np.nan
+    return cci
+
+
+# Panel computations as (columns, compute(high, low, close) -> {column: array}).
+# Each runs only if one of its columns is requested.
+PANEL_GROUPS = [
+    (('sma_50',), lambda high, low, close: {'sma_50': _sma(close, 50)}),
+    (('sma_200',), lambda high, low, close: {'sma_200': _sma(close, 200)}),
+    (('upper_bb', 'middle_bb', 'lower_bb'),
+     lambda high, low, close: dict(zip(('upper_bb', 'middle_bb', 'lower_bb'), _bbands(close, 20)))),
+    (('rsi',), lambda high, low, close: {'rsi': _rsi(close, 14)}),
+    (('macd', 'macd_signal', 'macd_hist'),
+     lambda high, low, close: dict(zip(('macd', 'macd_signal', 'macd_hist'), _macd(close, 12, 26, 9)))),
+    (('slowk', 'slowd'), lambda high, low, close: dict(zip(('slowk', 'slowd'), _stoch(high, low, close, 14, 3, 3)))),
+    (('adx',), lambda high, low, close: {'adx': _adx(high, low, close, 14)}),
+    (('cci',), lambda high, low, close: {'cci': _cci(high, low, close, 14)}),
+    # Ichimoku cloud, and Fibonacci levels from the high and low of everything seen so far
+    (tuple(ICHIMOKU_COLUMNS), lambda high, low, close: ichimoku(high, low, close)),
+    (tuple(FIB_COLUMNS), lambda high, low, close: fibonacci_levels(high, low)),
+]
+
+
+def calculate_panel_indicators(high, low, close, columns=None):
+    """
+    Compute the indicators of calculate_technical_indicators for a whole
+    universe in one pass.
+
+    high, low and close are (bars, symbols) arrays laid out as described at
+    the top of this module. Returns {column: (bars, symbols) array} for the
+    requested columns (all of INDICATOR_COLUMNS by default), with NaN where a
+    value is not defined yet (the per-symbol function fills those with 0;
+    split_panel callers should too). Indicators no requested column needs
+    are not computed.
+    """
+    high = np.asarray(high, dtype='f8')
+    low = np.asarray(low, dtype='f8')
+    close = np.asarray(close, dtype='f8')
+    wanted = resolve_columns(columns)
+    out = {}
+    for group_columns, compute in PANEL_GROUPS:
+        if any(column in wanted for column in group_columns):
+            out.update(compute(high, low, close))
+    return {column: out[column] for column in wanted}
+
+
+def calculate_technical_indicators_panel(frames, columns=None):
+    """
+    calculate_technical_indicators for many symbols at once.
+
+    Takes {symbol: OHLC DataFrame} and returns {symbol: DataFrame} with the
+    same columns and values as calculate_technical_indicators(df, columns)
+    would give for each symbol.
+    """
+    symbols, indexes, panels = make_panel(frames, columns=('high', 'low', 'close'))
+    indicators = calculate_panel_indicators(panels['high'], panels['low'], panels['close'], columns)
+    result = split_panel(symbols, indexes, indicators, frames)
+    for df in result.values():
+        df.fillna(0, inplace=True)
+    return result
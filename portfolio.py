@@ -8,6 +8,12 @@ import numpy as np
 import requests
 from sklearn.preprocessing import MinMaxScaler
 from trading_signals import TIINGO_API_KEY, generate_trading_signals
+from market_regime import MarketRegimeService
+from fill_tracker import FAILED_EVENTS, FILL_TIMEOUT, OrderNotFilled, fill_from_order
+from position_ledger import PositionLedger
+from price_cache import LastPriceCache
+from latency import latency
+from ttl_cache import TTLCache
 import talib
 import os
 
@@ -15,10 +21,19 @@ import os
 import pandas as pd
 
 
+# How long account and position refreshes for the REST endpoints are reused, in seconds
+PORTFOLIO_CACHE_TTL = float(os.environ.get("PORTFOLIO_CACHE_TTL", "2"))
+
+# Account fields served by account_snapshot()
+ACCOUNT_FIELDS = ('cash', 'buying_power', 'equity', 'portfolio_value', 'long_market_value', 'short_market_value')
+
+
 class Portfolio:
     def __init__(self, api_key, secret_key, base_url):
         self.api = tradeapi.REST(api_key, secret_key, base_url, api_version='v2')
-        self.positions = {}
+        # Positions live in the ledger; self.positions is the same dict
+        self.ledger = PositionLedger()
+        self.positions = self.ledger.positions
         # Add the buying power as an attribute that you update every time a buy or sell happens
         self.buying_power = float(self.api.get_account().buying_power)
 
@@ -26,6 +41,18 @@ class Portfolio:
         self.requests_made = 0
         self.time_last_request = time.time()
 
+        # Latest prices come from the stream; REST is only a fallback for stale symbols
+        self.prices = LastPriceCache(self.fetch_latest_prices)
+
+        # Broker reads for the dashboard: concurrent requests share one refresh
+        self.snapshots = TTLCache(PORTFOLIO_CACHE_TTL)
+
+        # Set with attach_fill_tracker to resolve order fills from the trade updates stream
+        self.fill_tracker = None
+
+        # Market regimes are computed from daily bars once per day and cached
+        self.regime_service = MarketRegimeService(self.get_market_regime_data)
+
         # Initialize portfolio with existing positions
         self.update_positions()
         
@@ -48,36 +75,43 @@ class Portfolio:
     def update_positions(self):
             # Before every API request, check the rate limit
             self.check_rate_limit()
-            # Then make the request
-            account = self.api.get_account()
-            positions = self.api.list_positions()
+            # Resync the ledger with the broker; list_positions already carries current prices
+            self.ledger.reconcile(self.api)
 
-            # get the latest trade prices for all symbols at once and store it in a dict
-            latest_prices = {pos.symbol: float(self.api.get_latest_trade(pos.symbol).price) for pos in positions}
-            #get current profit/loss percentage from
+    def refresh_positions(self):
+        # update_positions for the REST endpoint: reused while fresh, one broker call for concurrent requests
+        self.snapshots.get('positions', self.update_positions)
+        return self.ledger.snapshot()
 
+    def account_snapshot(self):
+        """Cash, buying power and equity from the broker, at most PORTFOLIO_CACHE_TTL seconds old."""
+        return self.snapshots.get('account', self._fetch_account)
 
-            for position in positions:
-                symbol = position.symbol
-                shares = float(position.qty)
-                buy_price = float(position.avg_entry_price)
-                #get total P/L and multiply by the number of shares
-                pl = float(position.unrealized_pl)
+    def _fetch_account(self):
+        self.check_rate_limit()
+        account = self.api.get_account()
+        return {field: float(getattr(account, field, 0) or 0) for field in ACCOUNT_FIELDS}
 
-                current_price = latest_prices[symbol]
-                self.positions[symbol] = {'shares': shares, 'buy_price': buy_price, 'current_price': current_price, 'pl': pl}
+    def get_total_value(self):
+        return self.account_snapshot()['portfolio_value']
+
+    def attach_fill_tracker(self, fill_tracker):
+        # Every fill from the stream (including bracket exits) updates the ledger
+        self.fill_tracker = fill_tracker
+        fill_tracker.add_callback(self.ledger.apply_fill)
+
+    def on_price(self, symbol, price):
+        # Mark positions and the price cache from the live bar stream
+        self.prices.update(symbol, price)
+        self.ledger.mark(symbol, price)
 
 
     def add_position(self, symbol, shares, buy_price):
-        self.positions[symbol] = {'shares': shares, 'buy_price': buy_price, 'current_price': 0, 'pl': 0}
-        self.update_positions()
+        self.ledger.set_position(symbol, shares, buy_price)
 
 
     def remove_position(self, symbol):
-        
-        if symbol in self.positions:
-            del self.positions[symbol]
-            self.update_positions()
+        self.ledger.remove_position(symbol)
 
     def execute_trade(self, symbol, signal):
         self.check_rate_limit()
@@ -115,21 +149,24 @@ class Portfolio:
             
     def short(self, symbol, stop_loss_percentage=0.05, take_profit_percentage=0.10):
         self.check_rate_limit()
-        qty = math.floor(self.calculate_buy_quantity(symbol, 0.06))  # 10% fraction to invest
+        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            print(f"No current price for {symbol}. Skipping trade.")
+            return
+        qty = math.floor(self.calculate_buy_quantity(symbol, 0.06, current_price))  # 10% fraction to invest
         print(qty)
         if qty > self.min_qty:
-            total_cost = qty * self.get_latest_price(symbol)
+            total_cost = qty * current_price
             if total_cost > self.buying_power:
                 print(f"Not enough buying power to buy {qty} shares of {symbol}. Skipping trade.")
                 return            
 
             # Calculate the stop loss and take profit prices
-            current_price = self.get_latest_price(symbol)
             stop_loss_price = round(current_price * (1 + stop_loss_percentage), 2)
             take_profit_price = round(current_price * (1 - take_profit_percentage), 2)
 
 
-            order = self.api.submit_order(
+            order = self.submit_order(
                 symbol=symbol,
                 qty=qty,
                 side='sell',
@@ -140,14 +177,14 @@ class Portfolio:
                 stop_loss={'stop_price': stop_loss_price}
             )
 
-            while order.status != 'filled':
-                order = self.api.get_order(order.id)
+            fill = self.wait_for_fill(order)
+            if fill is None:
+                return
 
-            print(f"Shorted {qty} shares of {symbol} at {order.filled_avg_price}.")
-            self.update_positions()
+            print(f"Shorted {qty} shares of {symbol} at {fill.price}.")
 
             # Update the buying power after the short
-            self.buying_power -= qty * float(order.filled_avg_price)
+            self.buying_power -= qty * fill.price
 
 
 
@@ -155,33 +192,24 @@ class Portfolio:
 
     def cover(self, symbol):
         self.check_rate_limit()
-        qty = math.floor(self.calculate_buy_quantity(symbol, 0.06))  
+        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            print(f"No current price for {symbol}. Skipping trade.")
+            return
+        qty = math.floor(self.calculate_buy_quantity(symbol, 0.06, current_price))  
 
         if qty > self.min_qty:
             if symbol in self.positions and self.positions[symbol]['shares'] < 0:
-                current_price = float(self.api.get_latest_trade(symbol).price)
-
-                current_price = self.get_latest_price(symbol)
-
-                
 
-                order = self.api.submit_order(
+                order = self.submit_order(
                     symbol=symbol,
                     qty=qty,
                     side='buy',
                     type='market',
                     time_in_force='day'
                 )
-                while order.status != 'filled':
-                    order = self.api.get_order(order.id)
-                    time.sleep(.5)
-
-                self.positions[symbol]['shares'] += qty
-                self.update_positions()
-                
-
-                if self.positions[symbol]['shares'] == 0:
-                    self.positions[symbol]['buy_price'] = 0.0
+                if self.wait_for_fill(order) is None:
+                    return
 
                 # Update the buying power after the cover
                 self.buying_power += qty * float(current_price)
@@ -192,24 +220,24 @@ class Portfolio:
 
     def buy(self, symbol, stop_loss_percentage=0.05, take_profit_percentage=0.10):
             self.check_rate_limit()
-            qty = math.floor(self.calculate_buy_quantity(symbol, 0.06))
+            current_price = self.get_latest_price(symbol)
+            if current_price is None:
+                print(f"No current price for {symbol}. Skipping trade.")
+                return
+            qty = math.floor(self.calculate_buy_quantity(symbol, 0.06, current_price))
             print(f'Buying {qty} share(s) of {symbol}')  
             if qty > self.min_qty:
-                if symbol not in self.positions:
-                    self.positions[symbol] = {'shares': 0, 'buy_price': 0.0, 'current_price': 0, 'pl': 0}
-
-                total_cost = qty * self.get_latest_price(symbol)
+                total_cost = qty * current_price
                 if total_cost > self.buying_power:
                     print(f"Not enough buying power to buy {qty} shares of {symbol}. Skipping trade.")
                     return
                 
                 
-                current_price = self.get_latest_price(symbol)
                 stop_loss_price = round(current_price * (1 - stop_loss_percentage), 2)
                 take_profit_price = round(current_price * (1 + take_profit_percentage), 2)
 
 
-                order = self.api.submit_order(
+                order = self.submit_order(
                     symbol=symbol,
                     qty=qty,
                     side='buy',
@@ -221,37 +249,33 @@ class Portfolio:
                 )
 
                 # Wait for the order to fill
-                while order.status != 'filled':
-                    order = self.api.get_order(order.id)
-                    # print('Waiting for order fill...')
-                    time.sleep(2)
-
-                self.positions[symbol]['shares'] += qty
-                self.update_positions()
-                
-                print(f"Bought {qty} shares of {symbol} at {order.filled_avg_price}.")
-                self.positions[symbol]['buy_price'] = float(order.filled_avg_price)
+                fill = self.wait_for_fill(order)
+                if fill is None:
+                    return
 
+                print(f"Bought {qty} shares of {symbol} at {fill.price}.")
 
                 # Update the buying power after the purchase
-                self.buying_power -= qty * float(self.positions[symbol]['buy_price'])
+                self.buying_power -= qty * fill.price
 
 
 
     def sell(self, symbol, stop_loss_percentage=0.05, take_profit_percentage=0.10):
         self.check_rate_limit()
-        qty = math.floor(self.calculate_sell_quantity(symbol, 0.06))  # 10% fraction to sell
+        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            print(f"No current price for {symbol}. Skipping trade.")
+            return
+        qty = math.floor(self.calculate_sell_quantity(symbol, 0.06, current_price))  # 10% fraction to sell
         print(f"Trying to sell {qty} shares of {symbol}.")
         if qty > self.min_qty:
             if symbol in self.positions and self.positions[symbol]['shares'] > 0:
-                current_price = float(self.api.get_latest_trade(symbol).price)
                 profit_ratio = current_price / self.positions[symbol]['buy_price']
                 
-                current_price = self.get_latest_price(symbol)
                 stop_loss_price = round(current_price * (1 + stop_loss_percentage), 2)
                 take_profit_price = round(current_price * (1 - take_profit_percentage), 2)
          
-                order = self.api.submit_order(
+                order = self.submit_order(
                     symbol=symbol,
                     qty=qty,
                     side='buy',
@@ -262,22 +286,62 @@ class Portfolio:
                     stop_loss={'stop_price': stop_loss_price}
                 )
 
-            # Wait for the order to fill
-            while order.status != 'filled':
-                order = self.api.get_order(order.id)
-                time.sleep(.5)
+                # Wait for the order to fill
+                if self.wait_for_fill(order) is None:
+                    return
+
+                print(f"Sold {qty} shares of {symbol} at {current_price} for a profit of {profit_ratio}.")
 
-            self.positions[symbol]['shares'] -= qty
-            self.update_positions()
-            print(f"Sold {qty} shares of {symbol} at {current_price} for a profit of {profit_ratio}.")
+                # Update the buying power after the sale
+                self.buying_power += qty * float(current_price)
 
-            if self.positions[symbol]['shares'] == 0:
-                self.positions[symbol]['buy_price'] = 0.0
 
-            # Update the buying power after the sale
-            self.buying_power += qty * float(current_price)
 
+    def submit_order(self, **order):
+        # The broker call is timed as the 'order_submit' latency stage
+        with latency.timer('order_submit', order.get('symbol')):
+            submitted = self.api.submit_order(**order)
+        # Cash and buying power change with the order
+        self.snapshots.invalidate('account')
+        return submitted
 
+    def wait_for_fill(self, order, timeout=FILL_TIMEOUT):
+        """
+        Wait until an order is filled and return its Fill, or None if it was
+        not filled within timeout seconds (or was canceled/rejected).
+
+        With a fill tracker attached this waits on the trade updates stream;
+        otherwise it falls back to polling get_order. The wait is recorded as
+        the 'fill' latency stage.
+        """
+        start = time.perf_counter_ns()
+        if self.fill_tracker is not None:
+            try:
+                fill = self.fill_tracker.wait(order.id, timeout)
+                latency.since('fill', order.symbol, start)
+                return fill
+            except TimeoutError:
+                print(f"Order {order.id} for {order.symbol} was not filled after {timeout} seconds.")
+            except OrderNotFilled as e:
+                print(e)
+            return None
+
+        deadline = time.time() + timeout
+        while order.status != 'filled':
+            if order.status in FAILED_EVENTS:
+                print(f"Order {order.id} was {order.status}")
+                return None
+            if time.time() > deadline:
+                print(f"Order {order.id} for {order.symbol} was not filled after {timeout} seconds.")
+                return None
+            time.sleep(.5)
+            self.check_rate_limit()
+            order = self.api.get_order(order.id)
+        # No stream to deliver the fill, so book it here
+        fill = fill_from_order(order)
+        self.ledger.apply_fill(fill)
+        latency.since('fill', order.symbol, start)
+        return fill
 
     def get_buying_power(self):
         self.check_rate_limit()
@@ -285,17 +349,23 @@ class Portfolio:
 
 
     def get_latest_price(self, symbol):
-        self.check_rate_limit()
-        return float(self.api.get_latest_trade(symbol).price)
+        # Memory lookup while the streamed price is fresh; None if there is no recent price
+        return self.prices.get(symbol)
 
-    def calculate_buy_quantity(self, symbol, fraction):
+    def fetch_latest_prices(self, symbols):
+        # One batched request for every symbol whose cached price is stale
         self.check_rate_limit()
+        trades = self.api.get_latest_trades(symbols)
+        return {symbol: float(trade.price) for symbol, trade in trades.items()}
+
+    def calculate_buy_quantity(self, symbol, fraction, current_price=None):
         """
         Calculate the quantity to buy for a symbol.
 
         Args:
         symbol (str): The symbol to calculate quantity for.
         fraction (float): The fraction of total equity to spend.
+        current_price (float): The price to size with, looked up if not given.
 
         Returns:
         float: The quantity to buy.
@@ -303,10 +373,11 @@ class Portfolio:
         # Calculate total cost
         total_cost = self.buying_power * fraction
         #get the current price
-        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            current_price = self.get_latest_price(symbol)
         
         # Calculate quantity based on total cost and current price
-        qty = total_cost / current_price if current_price > 0 else 0
+        qty = total_cost / current_price if current_price is not None and current_price > 0 else 0
 
         # If total cost is less than 1, set quantity to 0
         if total_cost < 1:
@@ -315,24 +386,25 @@ class Portfolio:
         return qty
 
     
-    def calculate_sell_quantity(self, symbol, fraction):
-        self.check_rate_limit()
+    def calculate_sell_quantity(self, symbol, fraction, current_price=None):
         """
         Calculate the quantity to sell for a symbol.
 
         Args:
         symbol (str): The symbol to calculate quantity for.
         fraction (float): The fraction of total equity to sell.
+        current_price (float): The price to size with, looked up if not given.
 
         Returns:
         float: The quantity to sell.
         """
         # Calculate total cost
         total_cost = self.positions[symbol]['current_price'] * self.positions[symbol]['shares'] * fraction
-        current_price = self.get_latest_price(symbol)
+        if current_price is None:
+            current_price = self.get_latest_price(symbol)
         
         # Calculate quantity based on total cost and current price
-        qty = total_cost / current_price if current_price > 0 else 0
+        qty = total_cost / current_price if current_price is not None and current_price > 0 else 0
 
         # If total cost is less than 1, set quantity to 0
         if total_cost < 1:
@@ -341,9 +413,10 @@ class Portfolio:
         return qty
 
 
-    def get_market_regime_data(self, symbol, period):
+    def get_market_regime_data(self, symbol, period, start_date=None):
         end_date = datetime.now()
-        start_date = end_date - timedelta(days=period)
+        if start_date is None:
+            start_date = end_date - timedelta(days=period)
 
         url = f"https://api.tiingo.com/tiingo/daily/{symbol}/prices"
         headers = {
@@ -361,6 +434,8 @@ class Portfolio:
             return None
 
         data = response.json()
+        if not data:
+            return None
 
         df = pd.DataFrame(data)
 
@@ -368,58 +443,17 @@ class Portfolio:
         return df
 
     
-    def get_market_regime(self, symbol, short_period=10, long_period=20, adx_period=14, atr_period=14):
-        self.check_rate_limit()
-            
-        required_period = max(long_period+1000, adx_period+1000, atr_period+1000)
-        market_data = self.get_market_regime_data(symbol, period=required_period)
-        market_data['symbol'] = symbol
-
-        close = market_data['close']
-        high = market_data['high']
-        low = market_data['low']
-
-        short_sma = talib.SMA(close, timeperiod=short_period)
-        long_sma = talib.SMA(close, timeperiod=long_period)
-        adx = talib.ADX(high, low, close, timeperiod=adx_period)
-        atr = talib.ATR(high, low, close, timeperiod=atr_period)
-
-        sma_trend = (short_sma > long_sma).astype(int) - (short_sma < long_sma).astype(int)
-
-        market_data = market_data.assign(
-            short_sma=short_sma,
-            long_sma=long_sma,
-            adx=adx,
-            atr=atr,
-            sma_trend=sma_trend,
-        )
-
-        atr_threshold = 1.5 * atr.median()
-        market_data['median_atr'] = atr.median()
-
-        market_data.to_csv(f'./market_regime_data/{symbol}_market_regime.csv')
-        #fill with 0s
-        market_data = market_data.fillna(0)
-
-        last_sma_trend = sma_trend.iat[-1]
-        last_adx = adx.iat[-1]
-        last_atr = atr.iat[-1]
-
-        if last_sma_trend > 0 and last_adx > 25:
-            return 'bullish'
-        elif last_sma_trend < 0 and last_adx > 25:
-            return 'bearish'
-        elif last_atr < atr_threshold:
-            return 'low_volatility'
-        else:
-            return 'high_volatility'
+    def get_market_regime(self, symbol):
+        # Served from memory; daily bars are only fetched once per trading day
+        return self.regime_service.get_regime(symbol)
 
 
 
     def get_short_positions(self):
         self.check_rate_limit()
         short_positions = {}
-        for symbol, position_data in self.positions.items():
+        # A copy: the reconciler and fills change the ledger from other threads
+        for symbol, position_data in self.ledger.snapshot().items():
             if position_data['shares'] < 0:
                 short_positions[symbol] = position_data
         return short_positions
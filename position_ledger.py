@@ -0,0 +1,115 @@
+import copy
+import threading
+import time
+import traceback
+
+
+class PositionLedger:
+    """
+    Local copy of the portfolio's positions.
+
+    Positions are updated from fills as they happen and current_price / pl are
+    marked from the live bar stream, so reading positions never needs a REST
+    call. reconcile() replaces the local state with the broker's positions in
+    a single list_positions call, and start_reconciler() does that
+    periodically in the background to correct any drift. A fill from before
+    the last reconcile is already in the broker's positions, so apply_fill
+    skips it (fills from the stream can arrive after a reconcile that
+    counted them).
+
+    positions uses the same layout the Portfolio has always used:
+    {symbol: {'shares', 'buy_price', 'current_price', 'pl'}}. The dict is
+    only ever updated in place, so other objects can hold on to it; lookups
+    with get() are safe, but anything that iterates it should iterate
+    snapshot() instead, since other threads add and remove symbols.
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.lock = threading.RLock()
+        self.reconciler = None
+        # When the last reconcile asked the broker for its positions (epoch seconds)
+        self.last_reconcile = None
+
+    def apply_fill(self, fill):
+        signed_qty = fill.qty if fill.side == 'buy' else -fill.qty
+        with self.lock:
+            if fill.filled_at is not None and self.last_reconcile is not None and fill.filled_at < self.last_reconcile:
+                # Already counted in the reconciled positions
+                return
+            position = self.positions.get(fill.symbol)
+            if position is None:
+                position = {'shares': 0.0, 'buy_price': 0.0, 'current_price': fill.price, 'pl': 0.0}
+            shares = position['shares']
+            new_shares = shares + signed_qty
+
+            if new_shares == 0:
+                self.positions.pop(fill.symbol, None)
+                return
+            if shares == 0 or (shares > 0) == (signed_qty > 0):
+                # Adding to the position: average the entry price
+                position['buy_price'] = (abs(shares) * position['buy_price'] + fill.qty * fill.price) / abs(new_shares)
+            elif (shares > 0) != (new_shares > 0):
+                # Flipped from long to short (or back): the rest was opened at this price
+                position['buy_price'] = fill.price
+            position['shares'] = new_shares
+            self.positions[fill.symbol] = position
+            self._mark(position, fill.price)
+
+    def mark(self, symbol, price):
+        """Update current_price and pl of a position from the latest price."""
+        with self.lock:
+            position = self.positions.get(symbol)
+            if position is not None:
+                self._mark(position, price)
+
+    def _mark(self, position, price):
+        position['current_price'] = float(price)
+        position['pl'] = (position['current_price'] - position['buy_price']) * position['shares']
+
+    def set_position(self, symbol, shares, buy_price):
+        with self.lock:
+            self.positions[symbol] = {'shares': shares, 'buy_price': buy_price, 'current_price': 0, 'pl': 0}
+
+    def remove_position(self, symbol):
+        with self.lock:
+            self.positions.pop(symbol, None)
+
+    def reconcile(self, api):
+        """Replace the local positions with the broker's (one list_positions call)."""
+        # Every fill before the request is in the response
+        requested = time.time()
+        broker_positions = api.list_positions()
+        broker_symbols = {position.symbol for position in broker_positions}
+        with self.lock:
+            for symbol in list(self.positions):
+                if symbol not in broker_symbols:
+                    del self.positions[symbol]
+            for position in broker_positions:
+                self.positions[position.symbol] = {
+                    'shares': float(position.qty),
+                    'buy_price': float(position.avg_entry_price),
+                    'current_price': float(position.current_price),
+                    'pl': float(position.unrealized_pl),
+                }
+            self.last_reconcile = requested
+
+    def start_reconciler(self, api, interval=60):
+        """Reconcile with the broker every interval seconds on a daemon thread."""
+        if self.reconciler is not None:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reconcile(api)
+                except Exception:
+                    traceback.print_exc()
+
+        self.reconciler = threading.Thread(target=run, name='position-reconciler', daemon=True)
+        self.reconciler.start()
+
+    def snapshot(self):
+        with self.lock:
+            return copy.deepcopy(self.positions)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+
+class LastPriceCache:
+    """
+    Last traded price per symbol, fed by the bar/trade stream.
+
+    get() returns the cached price while it is younger than max_age seconds.
+    When it is missing or stale, every stale symbol the cache knows about is
+    refreshed together with one call to fetch_latest(symbols), which must
+    return {symbol: price}. A symbol that is still missing or stale after
+    that (the fetch failed or did not include it) has no price: None.
+    """
+
+    def __init__(self, fetch_latest, max_age=90):
+        self.fetch_latest = fetch_latest
+        self.max_age = max_age
+        self.prices = {}
+        self.lock = threading.Lock()
+
+    def update(self, symbol, price, timestamp=None):
+        with self.lock:
+            self.prices[symbol] = (float(price), timestamp if timestamp is not None else time.time())
+
+    def get(self, symbol, max_age=None):
+        return self.get_many([symbol], max_age)[symbol]
+
+    def get_many(self, symbols, max_age=None):
+        max_age = self.max_age if max_age is None else max_age
+        now = time.time()
+        with self.lock:
+            stale = [symbol for symbol in symbols if symbol not in self.prices or now - self.prices[symbol][1] > max_age]
+            if stale:
+                # Batch in any other symbol that has gone stale so the next lookups are free
+                stale += [symbol for symbol, (_, updated) in self.prices.items() if now - updated > max_age and symbol not in stale]
+
+        if stale:
+            try:
+                latest = self.fetch_latest(stale)
+            except Exception as e:
+                print(f"Could not fetch latest prices for {stale}: {e}")
+                latest = {}
+            for symbol, price in latest.items():
+                self.update(symbol, price, now)
+
+        with self.lock:
+            return {symbol: self._fresh(symbol, now, max_age) for symbol in symbols}
+
+    def _fresh(self, symbol, now, max_age):
+        price, updated = self.prices.get(symbol, (None, None))
+        if price is None or now - updated > max_age:
+            return None
+        return price
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { ChakraProvider, Box } from '@chakra-ui/react';
 import { io } from 'socket.io-client';
 
@@ -11,22 +11,43 @@ import AssetInfo from './components/AssetInfo';
 
 import { getSymbols } from './utils/api';
 import { SOCKET_SERVER_URL } from './utils/socket';
+import { applyMarketData, subscribeMarketData, unsubscribeMarketData } from './utils/marketData';
 
 function App() {
   const [symbols, setSymbols] = useState([]);
   const [marketData, setMarketData] = useState({});
+  const socketRef = useRef(null);
+  const subscribed = useRef([]);
+  const frames = useRef({});
 
   useEffect(() => {
-    getSymbols().then((response) => {
-      setSymbols(response.data);
+    getSymbols().then((data) => {
+      setSymbols(data);
     });
 
     const socket = io(SOCKET_SERVER_URL);
+    socketRef.current = socket;
 
-    socket.on('market_data', (data) => {
+    // Rooms belong to a connection, so subscribe again after reconnecting
+    socket.on('connect', () => {
+      if (subscribed.current.length > 0) {
+        subscribeMarketData(socket, subscribed.current);
+      }
+    });
+
+    socket.on('market_data', (message) => {
+      if (!subscribed.current.includes(message.symbol)) {
+        return;
+      }
+      const frame = applyMarketData(frames.current[message.symbol], message);
+      if (!frame) {
+        subscribeMarketData(socket, [message.symbol]);
+        return;
+      }
+      frames.current[message.symbol] = frame;
       setMarketData((prevData) => ({
         ...prevData,
-        [data.symbol]: data.data,
+        [message.symbol]: frame,
       }));
     });
 
@@ -35,6 +56,36 @@ function App() {
     };
   }, []);
 
+  // Only the listed symbols are sent to this client
+  useEffect(() => {
+    const socket = socketRef.current;
+    const wanted = symbols || [];
+    const added = wanted.filter((symbol) => !subscribed.current.includes(symbol));
+    const removed = subscribed.current.filter((symbol) => !wanted.includes(symbol));
+    subscribed.current = wanted;
+    removed.forEach((symbol) => {
+      delete frames.current[symbol];
+    });
+
+    if (socket && socket.connected) {
+      if (added.length > 0) {
+        subscribeMarketData(socket, added);
+      }
+      if (removed.length > 0) {
+        unsubscribeMarketData(socket, removed);
+      }
+    }
+    if (removed.length > 0) {
+      setMarketData((prevData) => {
+        const nextData = { ...prevData };
+        removed.forEach((symbol) => {
+          delete nextData[symbol];
+        });
+        return nextData;
+      });
+    }
+  }, [symbols]);
+
   return (
     <ChakraProvider>
       <Box>
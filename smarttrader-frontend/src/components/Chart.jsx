@@ -1,40 +1,18 @@
-import React, { useEffect, useState } from 'react';
+import React, { useMemo } from 'react';
 import { Line } from 'react-chartjs-2';
 import { Box } from '@chakra-ui/react';
-import { useSocket } from '../utils/socket';
 
-const Chart = () => {
-  const [chartData, setChartData] = useState({});
-  const socket = useSocket();
-
-  useEffect(() => {
-    if (socket) {
-      socket.on('market_data', (data) => {
-        const parsedData = JSON.parse(data.data);
-        const labels = Object.keys(parsedData);
-        const closePrices = labels.map((label) => parsedData[label].close);
-
-        setChartData({
-          labels: labels,
-          datasets: [
-            {
-              label: data.symbol,
-              data: closePrices,
-              fill: false,
-              backgroundColor: 'rgba(75,192,192,0.4)',
-              borderColor: 'rgba(75,192,192,1)',
-            },
-          ],
-        });
-      });
-    }
-
-    return () => {
-      if (socket) {
-        socket.off('market_data');
-      }
-    };
-  }, [socket]);
+// Close prices of the subscribed symbols, from the frames App keeps up to date
+const Chart = ({ marketData = {} }) => {
+  const chartData = useMemo(() => ({
+    datasets: Object.entries(marketData).map(([symbol, frame]) => ({
+      label: symbol,
+      data: frame.index.map((timestamp, row) => ({ x: timestamp, y: frame.columns.close[row] })),
+      fill: false,
+      backgroundColor: 'rgba(75,192,192,0.4)',
+      borderColor: 'rgba(75,192,192,1)',
+    })),
+  }), [marketData]);
 
   return (
     <Box>
@@ -57,4 +35,4 @@ const Chart = () => {
   );
 };
 
-export default Chart;
\ No newline at end of file
+export default Chart;
@@ -0,0 +1,51 @@
+// Frames built from the 'market_data' socket messages (see market_feed.py).
+// A frame is { seq, index: [ms timestamps], columns: { name: [values] } }.
+
+// Join the symbols' rooms on the server; their full frames come back first.
+// Subscribing again to a symbol also asks for a new snapshot of it.
+export const subscribeMarketData = (socket, symbols) => {
+  socket.emit('subscribe_market_data', { symbols });
+};
+
+export const unsubscribeMarketData = (socket, symbols) => {
+  socket.emit('unsubscribe_market_data', { symbols });
+};
+
+// Returns the symbol's frame with the message applied, or null when the
+// message does not follow the frame and a new snapshot has to be requested.
+export const applyMarketData = (frame, message) => {
+  const { data } = message;
+  if (message.type === 'snapshot') {
+    return { seq: message.seq, index: data.index, columns: data.columns };
+  }
+  if (!frame || message.seq !== frame.seq + 1) {
+    return null;
+  }
+
+  // Drop the rows that left the window
+  let first = frame.index.findIndex((timestamp) => timestamp >= message.start);
+  if (first === -1) {
+    first = frame.index.length;
+  }
+  const names = Object.keys(frame.columns);
+  const index = frame.index.slice(first);
+  const columns = {};
+  names.forEach((name) => {
+    columns[name] = frame.columns[name].slice(first);
+  });
+
+  // Changed rows replace the ones with the same timestamp, new rows are appended
+  const rowOf = new Map(index.map((timestamp, row) => [timestamp, row]));
+  data.index.forEach((timestamp, deltaRow) => {
+    let row = rowOf.get(timestamp);
+    if (row === undefined) {
+      row = index.length;
+      index.push(timestamp);
+      rowOf.set(timestamp, row);
+    }
+    names.forEach((name) => {
+      columns[name][row] = data.columns[name][deltaRow];
+    });
+  });
+  return { seq: message.seq, index, columns };
+};
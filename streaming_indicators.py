@@ -0,0 +1,319 @@
+import math
+from collections import deque
+
+from indicator_kernels import CHIKOU_SHIFT, RollingExtreme, StreamingFibonacci, StreamingIchimoku
+
+
+# Columns produced by calculate_technical_indicators, in the same order
+INDICATOR_COLUMNS = [
+    'sma_50', 'sma_200', 'upper_bb', 'middle_bb', 'lower_bb', 'rsi',
+    'macd', 'macd_signal', 'macd_hist', 'slowk', 'slowd', 'adx', 'cci',
+    'tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou_span',
+    'fib_0', 'fib_0.236', 'fib_0.382', 'fib_0.5', 'fib_0.618', 'fib_0.786', 'fib_1',
+]
+
+# Same tolerance talib uses for its zero checks
+EPSILON = 0.00000000000001
+
+
+def _is_zero(value):
+    return -EPSILON < value < EPSILON
+
+
+def _shifted_variance(window):
+    """
+    Population variance of the window, computed relative to its first value
+    like talib does: the deviations stay small, so there is no cancellation
+    error, and a flat window has a variance of exactly 0.
+    """
+    first = window[0]
+    total = 0.0
+    total_sq = 0.0
+    for value in window:
+        deviation = value - first
+        total += deviation
+        total_sq += deviation * deviation
+    mean = total / len(window)
+    return total_sq / len(window) - mean * mean
+
+
+class RollingSum:
+    """Fixed window running sum, updated the same way talib.SMA does."""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, value):
+        # Returns the window sum once the window is full, otherwise None
+        self.total += value
+        self.window.append(value)
+        if len(self.window) < self.period:
+            return None
+        total = self.total
+        self.total -= self.window.popleft()
+        return total
+
+
+class StreamingEma:
+    """EMA seeded with the SMA of the first `period` values, like talib."""
+
+    def __init__(self, period):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.seed = []
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.seed.append(value)
+            if len(self.seed) == self.period:
+                self.value = sum(self.seed) / self.period
+                self.seed = []
+            return self.value
+        self.value = ((value - self.value) * self.k) + self.value
+        return self.value
+
+
+class StreamingAdx:
+    """Wilder's ADX updated one bar at a time, following talib.ADX step for step."""
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.prev_high = None
+        self.prev_low = None
+        self.prev_close = None
+        self.plus_dm = 0.0
+        self.minus_dm = 0.0
+        self.tr = 0.0
+        self.sum_dx = 0.0
+        self.value = None
+
+    def update(self, high, low, close):
+        period = self.period
+        if self.prev_close is not None:
+            diff_plus = high - self.prev_high
+            diff_minus = self.prev_low - low
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            if self.count >= period:
+                self.minus_dm -= self.minus_dm / period
+                self.plus_dm -= self.plus_dm / period
+            if diff_minus > 0 and diff_plus < diff_minus:
+                self.minus_dm += diff_minus
+            elif diff_plus > 0 and diff_plus > diff_minus:
+                self.plus_dm += diff_plus
+            if self.count < period:
+                self.tr += true_range
+            else:
+                self.tr = self.tr - self.tr / period + true_range
+                if not _is_zero(self.tr):
+                    minus_di = 100.0 * (self.minus_dm / self.tr)
+                    plus_di = 100.0 * (self.plus_dm / self.tr)
+                    total = minus_di + plus_di
+                    if not _is_zero(total):
+                        dx = 100.0 * (abs(minus_di - plus_di) / total)
+                        if self.count < 2 * period:
+                            self.sum_dx += dx
+                        else:
+                            self.value = ((self.value * (period - 1)) + dx) / period
+                if self.count == 2 * period - 1:
+                    self.value = self.sum_dx / period
+        self.prev_high = high
+        self.prev_low = low
+        self.prev_close = close
+        self.count += 1
+        return self.value
+
+
+class StreamingAtr:
+    """Wilder's ATR updated one bar at a time, like talib.ATR."""
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.prev_close = None
+        self.value = None
+
+    def update(self, high, low, close):
+        if self.prev_close is not None:
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+            if self.count <= self.period:
+                # Seeded with the average of the first `period` true ranges
+                self.value = (self.value or 0.0) + true_range
+                if self.count == self.period:
+                    self.value /= self.period
+            else:
+                self.value = ((self.value * (self.period - 1)) + true_range) / self.period
+        self.prev_close = close
+        self.count += 1
+        return self.value if self.count > self.period else None
+
+
+class StreamingIndicators:
+    """
+    Per-symbol indicator state that is updated one bar at a time.
+
+    Each call to update costs O(1) regardless of how much history has been
+    seen, and the values match calculate_technical_indicators run over the
+    same bars (warmup NaNs are reported as 0, as the batch version fills them).
+    The only exception is chikou_span, which needs the close 22 bars ahead:
+    the latest row always reports 0 and the caller should write the current
+    close into the row CHIKOU_SHIFT bars back.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.prev_high = None
+        self.prev_low = None
+        self.prev_close = None
+
+        # SMA / Bollinger Bands
+        self.sma_50 = RollingSum(50)
+        self.sma_200 = RollingSum(200)
+        self.bb_sum = RollingSum(20)
+        self.bb_window = deque(maxlen=20)
+
+        # RSI
+        self.rsi_period = 14
+        self.rsi_gain = 0.0
+        self.rsi_loss = 0.0
+
+        # MACD: both EMAs are seeded on the bar where the slow one is ready
+        self.macd_closes = deque(maxlen=26)
+        self.ema_fast = None
+        self.ema_slow = None
+        self.macd_signal = StreamingEma(9)
+
+        # STOCH
+        self.stoch_high = RollingExtreme(14, is_max=True)
+        self.stoch_low = RollingExtreme(14, is_max=False)
+        self.slowk_sum = RollingSum(3)
+        self.slowd_sum = RollingSum(3)
+
+        # ADX
+        self.adx = StreamingAdx(14)
+
+        # CCI
+        self.cci_window = deque(maxlen=14)
+
+        # Ichimoku
+        self.ichimoku = StreamingIchimoku()
+
+        # Fibonacci levels use the high and low of everything seen so far
+        self.fibonacci = StreamingFibonacci()
+
+    def prime(self, df):
+        """Replay a history of bars so the next update continues from it."""
+        for high, low, close in zip(df['high'].to_numpy(dtype='f8'), df['low'].to_numpy(dtype='f8'), df['close'].to_numpy(dtype='f8')):
+            self.update(high, low, close)
+        return self
+
+    def update(self, high, low, close):
+        """Add one bar and return a dict of indicator values for it."""
+        high = float(high)
+        low = float(low)
+        close = float(close)
+        row = {}
+
+        # Simple moving averages
+        total = self.sma_50.update(close)
+        row['sma_50'] = total / 50 if total is not None else None
+        total = self.sma_200.update(close)
+        row['sma_200'] = total / 200 if total is not None else None
+
+        # Bollinger Bands (20, 2 std devs)
+        total = self.bb_sum.update(close)
+        self.bb_window.append(close)
+        if total is not None:
+            middle = total / 20
+            variance = _shifted_variance(self.bb_window)
+            std_dev = math.sqrt(variance) if variance > 0.0 else 0.0
+            row['upper_bb'] = middle + 2.0 * std_dev
+            row['middle_bb'] = middle
+            row['lower_bb'] = middle - 2.0 * std_dev
+
+        # RSI (Wilder smoothing, seeded with the mean of the first 14 changes)
+        if self.prev_close is not None:
+            change = close - self.prev_close
+            if self.count <= self.rsi_period:
+                if change < 0:
+                    self.rsi_loss -= change
+                else:
+                    self.rsi_gain += change
+                if self.count == self.rsi_period:
+                    self.rsi_loss /= self.rsi_period
+                    self.rsi_gain /= self.rsi_period
+            else:
+                self.rsi_loss *= self.rsi_period - 1
+                self.rsi_gain *= self.rsi_period - 1
+                if change < 0:
+                    self.rsi_loss -= change
+                else:
+                    self.rsi_gain += change
+                self.rsi_loss /= self.rsi_period
+                self.rsi_gain /= self.rsi_period
+            if self.count >= self.rsi_period:
+                total = self.rsi_gain + self.rsi_loss
+                row['rsi'] = 100.0 * (self.rsi_gain / total) if not _is_zero(total) else 0.0
+
+        # MACD (12, 26, 9)
+        if self.ema_slow is None:
+            self.macd_closes.append(close)
+            if len(self.macd_closes) == 26:
+                closes = list(self.macd_closes)
+                self.ema_slow = sum(closes) / 26
+                self.ema_fast = sum(closes[-12:]) / 12
+                self.macd_closes = None
+        else:
+            self.ema_slow = ((close - self.ema_slow) * (2.0 / 27)) + self.ema_slow
+            self.ema_fast = ((close - self.ema_fast) * (2.0 / 13)) + self.ema_fast
+        if self.ema_slow is not None:
+            macd = self.ema_fast - self.ema_slow
+            signal = self.macd_signal.update(macd)
+            if signal is not None:
+                row['macd'] = macd
+                row['macd_signal'] = signal
+                row['macd_hist'] = macd - signal
+
+        # STOCH (14, 3, 3)
+        highest = self.stoch_high.update(high)
+        lowest = self.stoch_low.update(low)
+        if highest is not None:
+            diff = (highest - lowest) / 100.0
+            fastk = (close - lowest) / diff if diff != 0.0 else 0.0
+            total = self.slowk_sum.update(fastk)
+            if total is not None:
+                slowk = total / 3
+                total = self.slowd_sum.update(slowk)
+                if total is not None:
+                    row['slowk'] = slowk
+                    row['slowd'] = total / 3
+
+        # ADX (14)
+        adx = self.adx.update(high, low, close)
+        if adx is not None:
+            row['adx'] = adx
+
+        # CCI (14)
+        self.cci_window.append((high + low + close) / 3)
+        if len(self.cci_window) == 14:
+            # Averaged relative to the window's first value, so a flat window averages to exactly that value
+            first = self.cci_window[0]
+            average = first + sum(value - first for value in self.cci_window) / 14
+            mean_dev = sum(abs(value - average) for value in self.cci_window)
+            diff = self.cci_window[-1] - average
+            row['cci'] = diff / (0.015 * (mean_dev / 14)) if diff != 0.0 and mean_dev != 0.0 else 0.0
+
+        # Ichimoku cloud and Fibonacci retracement levels
+        row.update(self.ichimoku.update(high, low))
+        row.update(self.fibonacci.update(high, low))
+
+        self.prev_high = high
+        self.prev_low = low
+        self.prev_close = close
+        self.count += 1
+
+        # Match the fillna(0) of the batch version
+        return {column: (row.get(column) if row.get(column) is not None else 0.0) for column in INDICATOR_COLUMNS}
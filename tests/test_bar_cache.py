@@ -0,0 +1,28 @@
+from datetime import date
+
+import pandas as pd
+
+import bar_cache
+
+
+def _bars(day, minutes):
+    index = pd.date_range(f"{day} 14:30", periods=minutes, freq="min", tz="UTC", name="date")
+    return pd.DataFrame({"close": range(minutes)}, index=index, dtype="f8")
+
+
+def test_today_is_refetched_after_midnight(tmp_path, monkeypatch):
+    monkeypatch.setattr(bar_cache, "BAR_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(bar_cache, "_today", lambda: date(2024, 1, 2))
+
+    # Midway through the day: the bars so far are served but the day is still missing
+    bar_cache.write_bars("AAPL", _bars("2024-01-02", 10), date(2024, 1, 2), date(2024, 1, 2))
+    assert len(bar_cache.read_bars("AAPL", "2024-01-02", "2024-01-02")) == 10
+    assert bar_cache.missing_ranges("AAPL", "2024-01-02", "2024-01-02") == [(date(2024, 1, 2), date(2024, 1, 2))]
+
+    # The next day the truncated day is fetched again, and only then complete
+    monkeypatch.setattr(bar_cache, "_today", lambda: date(2024, 1, 3))
+    assert bar_cache.missing_ranges("AAPL", "2024-01-02", "2024-01-02") == [(date(2024, 1, 2), date(2024, 1, 2))]
+    bar_cache.write_bars("AAPL", _bars("2024-01-02", 390), date(2024, 1, 2), date(2024, 1, 2))
+    assert bar_cache.missing_ranges("AAPL", "2024-01-02", "2024-01-02") == []
+    assert len(bar_cache.read_bars("AAPL", "2024-01-02", "2024-01-02")) == 390
+    assert not (tmp_path / "AAPL" / "2024-01-02.partial.parquet").exists()
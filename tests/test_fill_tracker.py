@@ -0,0 +1,78 @@
+import asyncio
+import threading
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from fill_tracker import FakeTradeUpdateStream, Fill, FillTracker, OrderNotFilled
+from position_ledger import PositionLedger
+
+
+def _tracker():
+    stream = FakeTradeUpdateStream()
+    tracker = FillTracker()
+    tracker.attach(stream)
+    return stream, tracker
+
+
+def test_wait_resolves_from_the_fill_event():
+    stream, tracker = _tracker()
+    # The fill arrives while a thread is already waiting on the order
+    threading.Timer(0.05, stream.fill, ('o1', 'AAPL', 'buy', 10, 150.5)).start()
+    fill = tracker.wait('o1', timeout=5)
+    assert fill._replace(filled_at=None) == Fill('o1', 'AAPL', 'buy', 10.0, 150.5)
+    assert fill.filled_at is not None
+
+
+def test_fill_before_wait_is_not_missed():
+    stream, tracker = _tracker()
+    stream.fill('o1', 'AAPL', 'sell', 3, 99.0)
+    assert tracker.wait('o1', timeout=0).qty == 3.0
+
+
+def test_wait_async_resolves_from_the_fill_event():
+    stream, tracker = _tracker()
+
+    async def run():
+        waiting = asyncio.ensure_future(tracker.wait_async('o1', timeout=5))
+        await asyncio.sleep(0)
+        await stream.send('fill', {'id': 'o1', 'symbol': 'MSFT', 'side': 'buy', 'filled_qty': '2', 'filled_avg_price': '300'})
+        return await waiting
+
+    assert asyncio.run(run()).price == 300.0
+
+
+def test_canceled_order_raises_and_other_events_are_ignored():
+    stream, tracker = _tracker()
+    stream.send_sync('new', {'id': 'o1', 'symbol': 'AAPL'})
+    stream.send_sync('canceled', {'id': 'o1', 'symbol': 'AAPL'})
+    with pytest.raises(OrderNotFilled):
+        tracker.wait('o1', timeout=0)
+
+
+def test_wait_times_out_without_a_fill():
+    _, tracker = _tracker()
+    with pytest.raises(TimeoutError):
+        tracker.wait('o1', timeout=0.01)
+    assert 'o1' not in tracker.pending
+
+
+def test_fills_update_the_ledger_unless_a_reconcile_counted_them():
+    stream, tracker = _tracker()
+    ledger = PositionLedger()
+    tracker.add_callback(ledger.apply_fill)
+
+    before = datetime.now(timezone.utc) - timedelta(seconds=1)
+    broker = SimpleNamespace(list_positions=lambda: [
+        SimpleNamespace(symbol='AAPL', qty='10', avg_entry_price='100', current_price='100', unrealized_pl='0'),
+    ])
+    ledger.reconcile(broker)
+
+    # Filled before the reconcile: already in the broker's 10 shares
+    stream.fill('o1', 'AAPL', 'buy', 10, 100.0, filled_at=before)
+    assert ledger.positions['AAPL']['shares'] == 10.0
+
+    stream.fill('o2', 'AAPL', 'buy', 5, 106.0)
+    assert ledger.positions['AAPL']['shares'] == 15.0
+    assert ledger.positions['AAPL']['buy_price'] == pytest.approx(102.0)
@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from market_feed import MarketFeed, encode_rows
+
+
+def _frame(rows):
+    index = pd.date_range('2024-01-02 14:30', periods=rows, freq='min', tz='UTC')
+    close = np.linspace(100, 101, rows)
+    return pd.DataFrame({
+        'close': close,
+        'sma_200': np.where(np.arange(rows) < rows - 2, np.nan, close),
+        'cci': np.where(np.arange(rows) == 0, np.inf, 0.0),
+        'chikou_span': np.nan,
+        'symbol': ['AAPL'] * (rows - 1) + [None],
+    }, index=index)
+
+
+def _strict_round_trip(message):
+    # Browsers' JSON.parse rejects NaN and Infinity, like allow_nan=False
+    return json.loads(json.dumps(message, allow_nan=False))
+
+
+def test_encode_rows_sends_missing_values_as_null():
+    encoded = _strict_round_trip(encode_rows(_frame(5)))
+    assert encoded['columns']['sma_200'] == [None, None, None, 100.75, 101.0]
+    assert encoded['columns']['cci'][0] is None
+    assert encoded['columns']['chikou_span'] == [None] * 5
+    assert encoded['columns']['symbol'][-1] is None
+    assert len(encoded['index']) == 5
+
+
+def test_snapshot_and_delta_are_strict_json():
+    feed = MarketFeed()
+    frame = _frame(30)
+    snapshot = _strict_round_trip(feed.update('AAPL', frame.iloc[:-1]))
+    delta = _strict_round_trip(feed.update('AAPL', frame))
+    assert snapshot['type'] == 'snapshot'
+    assert delta['type'] == 'delta'
+    assert delta['seq'] == snapshot['seq'] + 1
+    assert delta['data']['index'] == encode_rows(frame.iloc[-1:])['index']
+
+
+def test_market_data_page_is_strict_json():
+    # /market_data encodes panel indicator frames of symbols with different lengths
+    from panel_indicators import calculate_technical_indicators_panel
+
+    frames = {}
+    for rows, symbol in ((60, 'AAPL'), (45, 'MSFT')):
+        frame = _frame(rows)[['close']].assign(high=lambda df: df['close'] + 1, low=lambda df: df['close'] - 1)
+        frame.iloc[10, frame.columns.get_loc('close')] = np.nan
+        frames[symbol] = frame
+    rows = calculate_technical_indicators_panel(frames)
+    page = _strict_round_trip({symbol: encode_rows(df) for symbol, df in rows.items()})
+    assert len(page['MSFT']['index']) == 45
+    assert len(page['AAPL']['columns']['sma_200']) == 60
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from panel_indicators import calculate_technical_indicators_panel
+from streaming_indicators import INDICATOR_COLUMNS
+from trading_signals import SIGNAL_COLUMNS, calculate_technical_indicators
+
+
+def _bars(rows, seed=0, flat=(), start='2024-01-02 14:30'):
+    # A random walk; each (start, stop) in flat holds the price still, so the
+    # windows inside it have no range (the CCI and Bollinger Band zero cases)
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(rows).cumsum()
+    high = close + rng.random(rows)
+    low = close - rng.random(rows)
+    for flat_start, flat_stop in flat:
+        close[flat_start:flat_stop] = high[flat_start:flat_stop] = low[flat_start:flat_stop] = close[flat_start]
+    index = pd.date_range(start, periods=rows, freq='min', tz='UTC')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': 1.0}, index=index)
+
+
+def _frames():
+    # Different lengths (the panel pads the short ones), a symbol shorter than
+    # the slowest warm-up, flat runs, and timestamps that do not line up
+    return {
+        'AAA': _bars(500, seed=1, flat=[(250, 300)]),
+        'BBB': _bars(320, seed=2, flat=[(0, 40)], start='2024-01-03 15:00'),
+        'CCC': _bars(120, seed=3),
+    }
+
+
+def test_panel_matches_per_symbol_indicators():
+    frames = _frames()
+    panel = calculate_technical_indicators_panel(frames)
+    for symbol, df in frames.items():
+        expected = calculate_technical_indicators(df.copy())
+        assert list(panel[symbol].columns) == list(expected.columns)
+        assert panel[symbol].index.equals(df.index)
+        for column in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(panel[symbol][column], expected[column], rtol=1e-9, atol=1e-8,
+                                       err_msg=f'{symbol} {column}')
+
+
+def test_panel_computes_only_the_requested_columns():
+    frames = _frames()
+    columns = ['close'] + SIGNAL_COLUMNS
+    panel = calculate_technical_indicators_panel(frames, columns)
+    for symbol, df in frames.items():
+        expected = calculate_technical_indicators(df.copy(), columns)
+        assert list(panel[symbol].columns) == list(expected.columns)
+        assert 'adx' not in panel[symbol].columns
+        for column in SIGNAL_COLUMNS:
+            np.testing.assert_allclose(panel[symbol][column], expected[column], rtol=1e-9, atol=1e-8,
+                                       err_msg=f'{symbol} {column}')
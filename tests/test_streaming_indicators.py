@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+
+from streaming_indicators import INDICATOR_COLUMNS, StreamingIndicators
+from trading_signals import calculate_technical_indicators
+
+
+def _bars(rows, seed=0, flat=()):
+    # A random walk; each (start, stop) in flat holds the price still, so the
+    # windows inside it have no range (the CCI and Bollinger Band zero cases)
+    rng = np.random.default_rng(seed)
+    close = 100 + rng.standard_normal(rows).cumsum()
+    high = close + rng.random(rows)
+    low = close - rng.random(rows)
+    for start, stop in flat:
+        close[start:stop] = high[start:stop] = low[start:stop] = close[start]
+    index = pd.date_range('2024-01-02 14:30', periods=rows, freq='min', tz='UTC')
+    return pd.DataFrame({'open': close, 'high': high, 'low': low, 'close': close, 'volume': 1.0}, index=index)
+
+
+def _streamed(df):
+    indicators = StreamingIndicators()
+    rows = [indicators.update(high, low, close) for high, low, close in zip(df['high'], df['low'], df['close'])]
+    return pd.DataFrame(rows, index=df.index)
+
+
+def _assert_matches_batch(df):
+    batch = calculate_technical_indicators(df.copy())
+    streamed = _streamed(df)
+    # chikou_span needs the close CHIKOU_SHIFT bars ahead, so the stream leaves it to the caller
+    for column in INDICATOR_COLUMNS:
+        if column == 'chikou_span':
+            assert (streamed[column] == 0.0).all()
+            continue
+        np.testing.assert_allclose(streamed[column], batch[column], rtol=1e-9, atol=1e-8, err_msg=column)
+
+
+def test_matches_batch_indicators_including_warm_up():
+    # 250 bars: every indicator goes from its warm-up (0) to defined values
+    _assert_matches_batch(_bars(250))
+
+
+def test_matches_batch_indicators_over_flat_prices():
+    # A flat start (nothing but flat windows during the warm-up) and flat runs later on
+    _assert_matches_batch(_bars(500, seed=1, flat=[(0, 40), (250, 300), (420, 440)]))
+
+
+def test_flat_window_has_no_band_width_or_cci():
+    row = {}
+    indicators = StreamingIndicators()
+    for _ in range(30):
+        row = indicators.update(100.26734, 100.26734, 100.26734)
+    assert row['upper_bb'] == row['middle_bb'] == row['lower_bb']
+    assert row['cci'] == 0.0
+
+
+def test_prime_continues_like_one_stream():
+    df = _bars(300, seed=2)
+    primed = StreamingIndicators().prime(df.iloc[:200])
+    rows = [primed.update(high, low, close) for high, low, close in zip(df['high'][200:], df['low'][200:], df['close'][200:])]
+    expected = _streamed(df).iloc[200:]
+    pd.testing.assert_frame_equal(pd.DataFrame(rows, index=df.index[200:]), expected)
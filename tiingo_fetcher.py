@@ -0,0 +1,59 @@
+import asyncio
+
+import aiohttp
+
+import bar_cache
+from trading_signals import TIINGO_IEX_HEADERS, TIINGO_IEX_URL, tiingo_iex_params, tiingo_json_to_frame, tiingo_rate_limit
+
+
+# Upper bound on Tiingo requests in flight at the same time
+TIINGO_MAX_CONCURRENCY = 8
+
+
+async def fetch_tiingo_data_async(session, semaphore, symbol, start_date, end_date):
+    """Async version of trading_signals.fetch_tiingo_data using a shared session."""
+    # The bucket is shared with the synchronous fetcher, so both respect the same limit
+    await tiingo_rate_limit.acquire_async()
+    async with semaphore:
+        url = TIINGO_IEX_URL.format(symbol=symbol)
+        async with session.get(url, params=tiingo_iex_params(start_date, end_date)) as response:
+            data = await response.json(content_type=None)
+    return tiingo_json_to_frame(symbol, data)
+
+
+async def get_tiingo_data_async(session, semaphore, symbol, start_date, end_date):
+    """Async version of trading_signals.get_tiingo_data (reads the bar cache first)."""
+    loop = asyncio.get_running_loop()
+    for range_start, range_end in bar_cache.missing_ranges(symbol, start_date, end_date):
+        df = await fetch_tiingo_data_async(session, semaphore, symbol, range_start, range_end)
+        if df is not None:
+            await loop.run_in_executor(None, bar_cache.write_bars, symbol, df, range_start, range_end)
+
+    df = await loop.run_in_executor(None, bar_cache.read_bars, symbol, start_date, end_date)
+    if df is None:
+        print(f"No data returned from API for symbol: {symbol}")
+    return df
+
+
+async def get_universe_data_async(symbols, start_date, end_date, max_concurrency=TIINGO_MAX_CONCURRENCY):
+    """Fetch every symbol in parallel over one pooled connection. Returns {symbol: DataFrame or None}."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=max_concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers=TIINGO_IEX_HEADERS) as session:
+        results = await asyncio.gather(
+            *(get_tiingo_data_async(session, semaphore, symbol, start_date, end_date) for symbol in symbols),
+            return_exceptions=True,
+        )
+
+    data = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            print(f"Failed to fetch data for {symbol}: {result}")
+            result = None
+        data[symbol] = result
+    return data
+
+
+def get_universe_data(symbols, start_date, end_date, max_concurrency=TIINGO_MAX_CONCURRENCY):
+    """Blocking wrapper around get_universe_data_async for code outside an event loop."""
+    return asyncio.run(get_universe_data_async(symbols, start_date, end_date, max_concurrency))
@@ -1,160 +1,134 @@
 # Required Libraries
-import time
 import requests
 import os
 import pandas as pd
 import numpy as np
-import talib
 import traceback
-import asyncio
+import bar_cache
+from rate_limit import TokenBucket
+from indicator_graph import LazyIndicators, resolve_columns
+
+# Tiingo allows 200 requests a minute; allow short bursts and then refill steadily
+TIINGO_REQUESTS_PER_MINUTE = 200
+TIINGO_BURST = 20
+tiingo_rate_limit = TokenBucket(TIINGO_REQUESTS_PER_MINUTE / 60, TIINGO_BURST)
 
-time_last_request = time.time()
-requests_made = 0
 def check_rate_limit_tiingo():
-    # Add 1 to the number of requests made
-    global requests_made
-    global time_last_request
-    requests_made += 1
-    print(f"Tiingo Requests made: {requests_made}")
-
-    # If 60 seconds have passed since the last request reset the counter
-    if time.time() - time_last_request >= 60:
-        requests_made = 0
-        time_last_request = time.time()
-    elif requests_made >= 200:  # If the limit is hit, sleep for 60 seconds
-        print("Rate limit hit! Waiting 60 seconds...")
-        time.sleep(60)
-        requests_made = 0
-        time_last_request = time.time()
+    # Wait only until the next request is allowed
+    waited = tiingo_rate_limit.acquire()
+    if waited > 0:
+        print(f"Rate limit hit! Waited {waited:.2f} seconds.")
 
 
 # Tiingo API Key
 TIINGO_API_KEY = os.environ.get("TIINGO_API_KEY")
 
-def get_tiingo_data(symbol, start_date, end_date):
-    url = f"https://api.tiingo.com/iex/{symbol}/prices"
-    headers = {"Content-Type": "application/json","Authorization": f"Token {'6ceb439fce674f4b793a7ff074b9ca443d1c79bf'}"}
-    params = {"startDate": start_date, "endDate": end_date, "resampleFreq": "1min"}
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
-    
-    if not data:
-        print(f"No data returned from API for symbol: {symbol}")
-        return None
-    
-    df = pd.DataFrame(data)
-    df['symbol'] = symbol
-    df.set_index("date", inplace=True)
-    return df
-
-
+TIINGO_IEX_URL = "https://api.tiingo.com/iex/{symbol}/prices"
+TIINGO_IEX_HEADERS = {"Content-Type": "application/json","Authorization": f"Token {'6ceb439fce674f4b793a7ff074b9ca443d1c79bf'}"}
 
+# Reuse connections between Tiingo requests
+tiingo_session = requests.Session()
 
+def tiingo_iex_params(start_date, end_date):
+    return {"startDate": str(start_date), "endDate": str(end_date), "resampleFreq": "1min"}
 
+def fetch_tiingo_data(symbol, start_date, end_date):
+    """Request minute bars from Tiingo. Returns None if the request failed."""
+    check_rate_limit_tiingo()
+    url = TIINGO_IEX_URL.format(symbol=symbol)
+    response = tiingo_session.get(url, headers=TIINGO_IEX_HEADERS, params=tiingo_iex_params(start_date, end_date))
+    data = response.json()
+    return tiingo_json_to_frame(symbol, data)
 
-def calculate_ichimoku(df):
-    high_prices = df['high']
-    close_prices = df['close']
-    low_prices = df['low']
-
-    # Tenkan-sen (Conversion Line): (9-period high + 9-period low)/2
-    period9_high = high_prices.rolling(window=9).max()
-    period9_low = low_prices.rolling(window=9).min()
-    df['tenkan_sen'] = (period9_high + period9_low) / 2
-
-    # Kijun-sen (Base Line): (26-period high + 26-period low)/2
-    period26_high = high_prices.rolling(window=26).max()
-    period26_low = low_prices.rolling(window=26).min()
-    df['kijun_sen'] = (period26_high + period26_low) / 2
-
-    # Senkou Span A (Leading Span A): (Conversion Line + Base Line)/2
-    df['senkou_span_a'] = ((df['tenkan_sen'] + df['kijun_sen']) / 2).shift(26)
-
-    # Senkou Span B (Leading Span B): (52-period high + 52-period low)/2
-    period52_high = high_prices.rolling(window=52).max()
-    period52_low = low_prices.rolling(window=52).min()
-    df['senkou_span_b'] = ((period52_high + period52_low) / 2).shift(26)
 
-    # The most current closing price plotted 22 time periods behind (optional)
-    df['chikou_span'] = close_prices.shift(-22)
+def tiingo_json_to_frame(symbol, data):
+    # Anything other than a list of bars is an error message from the API
+    if not isinstance(data, list):
+        print(f"Tiingo request failed for symbol {symbol}: {data}")
+        return None
 
-    # Return dataframe with Ichimoku components
+    df = pd.DataFrame(data)
+    if df.empty:
+        return df
+    df['symbol'] = symbol
+    df['date'] = pd.to_datetime(df['date'], utc=True)
+    df.set_index("date", inplace=True)
     return df
 
-def fibonacci_retracement(df):
-    # Calculate the rolling high and low for the full period
-    df['rolling_high'] = df['high'].rolling(window=len(df), min_periods=1).max()
-    df['rolling_low'] = df['low'].rolling(window=len(df), min_periods=1).min()
-
-    # Calculate the difference between the high and low
-    diff = df['rolling_high'] - df['rolling_low']
-    
-    # Calculate Fibonacci levels and store them in the DataFrame
-    levels = [0, 0.236, 0.382, 0.5, 0.618, 0.786, 1]
-    for level in levels:
-        df[f'fib_{level}'] = df['rolling_high'] - diff * level
-
-    # Drop the rolling high and low as they're no longer needed
-    df = df.drop(columns=['rolling_high', 'rolling_low'])
 
+def get_tiingo_data(symbol, start_date, end_date):
+    # Only the days that are not in the local bar cache are requested from Tiingo
+    for range_start, range_end in bar_cache.missing_ranges(symbol, start_date, end_date):
+        df = fetch_tiingo_data(symbol, range_start, range_end)
+        if df is not None:
+            bar_cache.write_bars(symbol, df, range_start, range_end)
+
+    df = bar_cache.read_bars(symbol, start_date, end_date)
+    if df is None:
+        print(f"No data returned from API for symbol: {symbol}")
+        return None
     return df
 
 
-
 # Function to Calculate Technical Indicators including Ichimoku cloud
-def calculate_technical_indicators(df):
-    close = np.array(df['close'], dtype='f8')
-    high = np.array(df['high'], dtype='f8')
-    low = np.array(df['low'], dtype='f8')
-
-    # Calculate Technical Indicators
-    df['sma_50'] = talib.SMA(close, timeperiod=50)
-    df['sma_200'] = talib.SMA(close, timeperiod=200)
-    df['upper_bb'], df['middle_bb'], df['lower_bb'] = talib.BBANDS(close, timeperiod=20)
-    df['rsi'] = talib.RSI(close, timeperiod=14)
-    df['macd'], df['macd_signal'], df['macd_hist'] = talib.MACD(close, fastperiod=12, slowperiod=26, signalperiod=9)
-    df['slowk'], df['slowd'] = talib.STOCH(high, low, close, fastk_period=14, slowk_period=3, slowk_matype=0, slowd_period=3, slowd_matype=0)
-    df['adx'] = talib.ADX(high, low, close, timeperiod=14)
-    df['cci'] = talib.CCI(high, low, close, timeperiod=14)
-    
-    # Calculate Ichimoku cloud components
-    df = calculate_ichimoku(df)
-    df = fibonacci_retracement(df)
-    
+def calculate_technical_indicators(df, columns=None):
+    """
+    Add indicator columns to df. columns limits the work to the listed
+    indicators (and whatever they are computed from); by default every
+    column in INDICATOR_COLUMNS is added.
+    """
+    indicators = LazyIndicators(df)
+    for column in resolve_columns(columns):
+        df[column] = indicators[column]
+
     # Fill NaN values with 0
     df.fillna(0, inplace=True)
     
     return df
 
-def generate_basic_conditions(row, portfolio):
+# Indicator columns read by generate_market_conditions
+SIGNAL_COLUMNS = [
+    'sma_50', 'sma_200', 'upper_bb', 'lower_bb', 'rsi', 'macd', 'macd_signal', 'slowk', 'slowd',
+    'senkou_span_a', 'senkou_span_b', 'fib_0', 'fib_0.236', 'fib_0.5', 'fib_0.618', 'fib_0.786', 'fib_1',
+]
+
+def generate_market_conditions(data):
+    # Works on a single row or on a whole DataFrame (one boolean Series per condition)
+    return {
+        "macd_cross_up": data['macd'] > data['macd_signal'],
+        "macd_cross_down": data['macd'] < data['macd_signal'],
+        "sma_50_above_200": data['sma_50'] > data['sma_200'],
+        "sma_50_below_200": data['sma_50'] < data['sma_200'],
+        "rsi_less_than_30": data['rsi'] < 30,
+        "rsi_less_than_70": data['rsi'] < 70,
+        "rsi_greater_than_70": data['rsi'] > 70,
+        "close_less_than_lower_bb": data['close'] < data['lower_bb'],
+        "close_greater_than_upper_bb": data['close'] > data['upper_bb'],
+        "slowk_less_than_20": data['slowk'] < 20,
+        "slowd_less_than_20": data['slowd'] < 20,
+        "slowk_greater_than_80": data['slowk'] > 80,
+        "slowd_greater_than_80": data['slowd'] > 80,
+        "close_greater_than_senkou_span_a": data['close'] > data['senkou_span_a'],
+        "senkou_span_a_greater_than_b": data['senkou_span_a'] > data['senkou_span_b'],
+        "close_less_than_senkou_span_a": data['close'] < data['senkou_span_a'],
+        "close_less_than_senkou_span_b": data['close'] < data['senkou_span_b'],
+        "close_in_sma_50_band": (data['close'] > 0.95*data['sma_50']) & (data['close'] < 1.05*data['sma_50']),
+        "close_in_fib_0_band": (data['close'] > data['fib_0']) & (data['close'] < data['fib_0.236']),
+        "close_in_fib_0.5_band": (data['close'] > data['fib_0.5']) & (data['close'] < data['fib_0.618']),
+        "close_in_fib_1_band": (data['close'] > data['fib_0.786']) & (data['close'] < data['fib_1']),
+        "close_in_fib_2_band": (data['close'] > data['fib_0.618']) & (data['close'] < data['fib_0.786']),
+    }
+
+def generate_portfolio_conditions(symbol, portfolio):
     return {
-        "macd_cross_up": row['macd'] > row['macd_signal'],
-        "macd_cross_down": row['macd'] < row['macd_signal'],
-        "sma_50_above_200": row['sma_50'] > row['sma_200'],
-        "sma_50_below_200": row['sma_50'] < row['sma_200'],
-        "rsi_less_than_30": row['rsi'] < 30,
-        "rsi_less_than_70": row['rsi'] < 70,
-        "rsi_greater_than_70": row['rsi'] > 70,
-        "close_less_than_lower_bb": row['close'] < row['lower_bb'],
-        "close_greater_than_upper_bb": row['close'] > row['upper_bb'],
-        "slowk_less_than_20": row['slowk'] < 20,
-        "slowd_less_than_20": row['slowd'] < 20,
-        "slowk_greater_than_80": row['slowk'] > 80,
-        "slowd_greater_than_80": row['slowd'] > 80,
-        "close_greater_than_senkou_span_a": row['close'] > row['senkou_span_a'],
-        "senkou_span_a_greater_than_b": row['senkou_span_a'] > row['senkou_span_b'],
-        "close_less_than_senkou_span_a": row['close'] < row['senkou_span_a'],
-        "close_less_than_senkou_span_b": row['close'] < row['senkou_span_b'],
-        "close_in_sma_50_band": (row['close'] > 0.95*row['sma_50']) & (row['close'] < 1.05*row['sma_50']),
-        "close_in_fib_0_band": (row['close'] > row['fib_0']) & (row['close'] < row['fib_0.236']),
-        "close_in_fib_0.5_band": (row['close'] > row['fib_0.5']) & (row['close'] < row['fib_0.618']),
-        "close_in_fib_1_band": (row['close'] > row['fib_0.786']) & (row['close'] < row['fib_1']),
-        "close_in_fib_2_band": (row['close'] > row['fib_0.618']) & (row['close'] < row['fib_0.786']),
-        "portfolio_has_position": portfolio.positions.get(row['symbol'], {}).get('shares', 0) > 0,
-        "portfolio_has_short_position": portfolio.get_short_positions().get(row['symbol'], {}).get('shares', 0) < 0,
-        "portfolio_no_position": portfolio.positions.get(row['symbol'], {}).get('shares', 0) == 0,
+        "portfolio_has_position": portfolio.positions.get(symbol, {}).get('shares', 0) > 0,
+        "portfolio_has_short_position": portfolio.get_short_positions().get(symbol, {}).get('shares', 0) < 0,
+        "portfolio_no_position": portfolio.positions.get(symbol, {}).get('shares', 0) == 0,
     }
 
+def generate_basic_conditions(row, portfolio):
+    return {**generate_market_conditions(row), **generate_portfolio_conditions(row['symbol'], portfolio)}
+
 def generate_composite_conditions(basic_conditions):
     return {
         "bullish_cross": basic_conditions["macd_cross_up"] & basic_conditions["sma_50_above_200"],
@@ -190,68 +164,88 @@ def generate_advanced_conditions(basic_conditions, composite_conditions):
     return {**other_conditions, "hold": hold_condition}
 
 
-def generate_trading_signals(df, portfolio, market_regime):
+# Weight of each condition towards the chosen action for every market regime
+WEIGHTS_BY_REGIME = {
+    'bullish': {
+        "advanced_bullish_cross": 4.0,
+        "lower_risk_bullish": 3.5,
+        "high_risk_bullish": 2.0,
+        "advanced_bullish_ichimoku": 3.0,
+        "hold": 1.0,
+    },
+    'bearish': {
+        "advanced_bearish_cross": 4.0,
+        "high_risk_bearish": 2.0,
+        "lower_risk_bearish": 3.5,
+        "advanced_bearish_ichimoku": 3.0,
+        "hold": 1.0,
+    },
+    'low_volatility': {
+        "exit_bullish": 4.0,
+        "hold": 1.0,
+    },
+    'high_volatility': {
+        "exit_bearish": 4.0,
+        "hold": 1.0,
+    }
+}
+
+ACTIONS_TO_CONDITIONS = {
+    "buy": ["advanced_bullish_cross", "lower_risk_bullish", "high_risk_bullish", "advanced_bullish_ichimoku"],
+    "sell": ["advanced_bearish_cross", "lower_risk_bearish", "high_risk_bearish", "advanced_bearish_ichimoku"],
+    "short": ["high_risk_bearish", "advanced_bearish_ichimoku", "lower_risk_bearish"],
+    "cover": ["high_risk_bullish", "advanced_bullish_ichimoku", "lower_risk_bullish"],
+    "hold": ["exit_bullish", "exit_bearish", "hold"]
+}
+
+ACTIONS = list(ACTIONS_TO_CONDITIONS)
+
+# Every condition that feeds an action score, in a fixed order for the weight matrix
+SCORED_CONDITIONS = list(dict.fromkeys(condition for conditions in ACTIONS_TO_CONDITIONS.values() for condition in conditions))
+
+
+def get_weight_matrix(market_regime):
+    """Weights as a (conditions x actions) matrix, so scores = conditions @ weights."""
+    weights = WEIGHTS_BY_REGIME.get(market_regime, {})
+    matrix = np.zeros((len(SCORED_CONDITIONS), len(ACTIONS)))
+    for j, action in enumerate(ACTIONS):
+        for condition in ACTIONS_TO_CONDITIONS[action]:
+            matrix[SCORED_CONDITIONS.index(condition), j] = weights.get(condition, 0)
+    return matrix
+
+
+def create_signals_frame(df):
+    signals = pd.DataFrame(index=df.index)
+    signals['symbol'] = df['symbol']
+    signals['buy_price'] = 0.0
+    signals['num_shares'] = 0
+    signals['profit'] = 0.0
+    signals['signal'] = 'hold'
+    signals['short_sell_price'] = 0.0
+    signals['num_shares_shorted'] = 0
+    return signals
+
+
+def generate_trading_signals(df, portfolio, market_regime, vectorized=False):
+    if vectorized:
+        return generate_trading_signals_vectorized(df, portfolio, market_regime)
     try:
         print(market_regime)
         
-        signals = pd.DataFrame(index=df.index)
-        signals['symbol'] = df['symbol']
-        signals['buy_price'] = 0.0
-        signals['num_shares'] = 0
-        signals['profit'] = 0.0
-        signals['signal'] = 'hold'
-        signals['short_sell_price'] = 0.0
-        signals['num_shares_shorted'] = 0
+        signals = create_signals_frame(df)
+        weights = WEIGHTS_BY_REGIME.get(market_regime, {})
 
         for idx, row in df.iterrows():
             basic_conditions = generate_basic_conditions(row, portfolio)
             composite_conditions = generate_composite_conditions(basic_conditions)
             advanced_conditions = generate_advanced_conditions(basic_conditions, composite_conditions)
 
-
-            weights_by_regime = {
-                'bullish': {
-                    "advanced_bullish_cross": 4.0,
-                    "lower_risk_bullish": 3.5,
-                    "high_risk_bullish": 2.0,
-                    "advanced_bullish_ichimoku": 3.0,
-                    "hold": 1.0,
-                },
-                'bearish': {
-                    "advanced_bearish_cross": 4.0,
-                    "high_risk_bearish": 2.0,
-                    "lower_risk_bearish": 3.5,
-                    "advanced_bearish_ichimoku": 3.0,
-                    "hold": 1.0,
-                },
-                'low_volatility': {
-                    "exit_bullish": 4.0,
-                    "hold": 1.0,
-                },
-                'high_volatility': {
-                    "exit_bearish": 4.0,
-                    "hold": 1.0,
-                }
-            }
-
-
-
             # Merge all the conditions
             all_conditions = {**basic_conditions, **composite_conditions, **advanced_conditions}
 
-            weights = weights_by_regime.get(market_regime, {})
             # conditions_for_actions = {key: [key] for key in all_conditions.keys()}
 
-            actions_to_conditions = {
-                "buy": ["advanced_bullish_cross", "lower_risk_bullish", "high_risk_bullish", "advanced_bullish_ichimoku"],
-                "sell": ["advanced_bearish_cross", "lower_risk_bearish", "high_risk_bearish", "advanced_bearish_ichimoku"],
-                "short": ["high_risk_bearish", "advanced_bearish_ichimoku", "lower_risk_bearish"],
-                "cover": ["high_risk_bullish", "advanced_bullish_ichimoku", "lower_risk_bullish"],
-                "hold": ["exit_bullish", "exit_bearish", "hold"]
-            }
-
-
-            scores = {action: sum(weights.get(condition, 0) * all_conditions[condition] for condition in actions_to_conditions[action]) for action in actions_to_conditions}
+            scores = {action: sum(weights.get(condition, 0) * all_conditions[condition] for condition in ACTIONS_TO_CONDITIONS[action]) for action in ACTIONS_TO_CONDITIONS}
 
             if all(value == 0 for value in scores.values()):
                 scores['hold'] = 3.0
@@ -269,8 +263,9 @@ def generate_trading_signals(df, portfolio, market_regime):
 
 
             print(scores)
-            if row['symbol'] in portfolio.positions:
-                print(portfolio.positions[row['symbol']]['shares'])
+            position = portfolio.positions.get(row['symbol'])
+            if position is not None:
+                print(position['shares'])
 
 
             if max_score_action == "buy" and portfolio.buying_power > df.at[idx, 'close']:
@@ -290,13 +285,13 @@ def generate_trading_signals(df, portfolio, market_regime):
             elif max_score_action == "sell" and portfolio.positions.get(row['symbol'], {}).get('shares', 0) > 0:
                 signals.at[idx, 'signal'] = 'sell'
                 signals.at[idx, 'buy_price'] = df.at[idx, 'close']
-                signals.at[idx, 'num_shares'] = portfolio.positions.get(row['symbol'], 0)
+                signals.at[idx, 'num_shares'] = portfolio.positions.get(row['symbol'], {}).get('shares', 0)
                 signals.at[idx, 'profit'] = signals.at[idx, 'num_shares'] * (signals.at[idx, 'buy_price'] - df.at[idx, 'close'])
 
             elif max_score_action == "cover" and row['symbol'] in portfolio.get_short_positions():
                 signals.at[idx, 'signal'] = 'cover'
                 signals.at[idx, 'short_sell_price'] = df.at[idx, 'close']
-                signals.at[idx, 'num_shares_shorted'] = portfolio.get_short_positions().get(row['symbol'], 0)
+                signals.at[idx, 'num_shares_shorted'] = portfolio.get_short_positions().get(row['symbol'], {}).get('shares', 0)
                 signals.at[idx, 'profit'] = signals.at[idx, 'num_shares_shorted'] * (df.at[idx, 'close'] - signals.at[idx, 'short_sell_price'])
 
             elif max_score_action == "hold":
@@ -313,5 +308,78 @@ def generate_trading_signals(df, portfolio, market_regime):
         traceback.print_exc()
 
 
+def generate_trading_signals_vectorized(df, portfolio, market_regime):
+    """
+    Same result as generate_trading_signals, but every condition is computed
+    as a boolean column over the whole frame and the action scores come from
+    a single (rows x conditions) @ (conditions x actions) product.
+    """
+    try:
+        print(market_regime)
 
+        signals = create_signals_frame(df)
+        if df.empty:
+            return signals
+
+        # Portfolio state does not change while scoring, so look it up once per symbol
+        symbols = df['symbol']
+        short_positions = portfolio.get_short_positions()
+        shares = symbols.map(lambda symbol: portfolio.positions.get(symbol, {}).get('shares', 0)).to_numpy(dtype='f8')
+        short_shares = symbols.map(lambda symbol: portfolio.positions.get(symbol, {}).get('short_shares', 0)).to_numpy(dtype='f8')
+        shorted = symbols.map(lambda symbol: short_positions.get(symbol, {}).get('shares', 0)).to_numpy(dtype='f8')
+
+        basic_conditions = generate_market_conditions(df)
+        basic_conditions.update({
+            "portfolio_has_position": shares > 0,
+            "portfolio_has_short_position": shorted < 0,
+            "portfolio_no_position": shares == 0,
+        })
+        basic_conditions = {name: np.asarray(condition, dtype=bool) for name, condition in basic_conditions.items()}
+        composite_conditions = generate_composite_conditions(basic_conditions)
+        advanced_conditions = generate_advanced_conditions(basic_conditions, composite_conditions)
+        all_conditions = {**basic_conditions, **composite_conditions, **advanced_conditions}
+
+        conditions = np.column_stack([all_conditions[condition] for condition in SCORED_CONDITIONS]).astype('f8')
+        scores = conditions @ get_weight_matrix(market_regime)
+
+        hold = ACTIONS.index('hold')
+        scores[(scores == 0).all(axis=1), hold] = 3.0
+
+        # Now modify scores based on portfolio conditions
+        scores[shares <= 0, ACTIONS.index('sell')] = 0.0
+        scores[shares > 0, ACTIONS.index('short')] = 0.0
+        scores[short_shares <= 0, ACTIONS.index('cover')] = 0.0
+        actions = np.array(ACTIONS)[scores.argmax(axis=1)]
+
+        close = df['close'].to_numpy(dtype='f8')
+        buying_power = portfolio.buying_power
+        in_short_positions = symbols.isin(list(short_positions)).to_numpy()
+
+        buy = (actions == 'buy') & (buying_power > close)
+        short = actions == 'short'
+        sell = (actions == 'sell') & (shares > 0)
+        cover = (actions == 'cover') & in_short_positions
+
+        if buy.any():
+            signals.loc[buy, 'signal'] = 'buy'
+            signals.loc[buy, 'buy_price'] = close[buy]
+            signals.loc[buy, 'num_shares'] = buying_power // close[buy]
+        if short.any():
+            signals.loc[short, 'signal'] = 'short'
+            signals.loc[short, 'short_sell_price'] = close[short]
+            signals.loc[short, 'num_shares_shorted'] = buying_power // close[short]
+        if sell.any():
+            signals.loc[sell, 'signal'] = 'sell'
+            signals.loc[sell, 'buy_price'] = close[sell]
+            signals.loc[sell, 'num_shares'] = shares[sell]
+        if cover.any():
+            signals.loc[cover, 'signal'] = 'cover'
+            signals.loc[cover, 'short_sell_price'] = close[cover]
+            signals.loc[cover, 'num_shares_shorted'] = shorted[cover]
+
+        # Every branch above books the trade at the current close, so profit stays 0
+        signals.fillna(0, inplace=True)
 
+        return signals
+    except Exception as e:
+        traceback.print_exc()
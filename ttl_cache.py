@@ -0,0 +1,66 @@
+import threading
+import time
+
+
+class _Flight:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Values that are reloaded at most once every ttl seconds.
+
+    get(key, load) returns the cached value while it is younger than ttl.
+    Otherwise load() is called, but only by one caller: requests arriving
+    while it runs wait for that same result instead of calling load()
+    themselves (single flight). A load that raises is not cached; its
+    waiters get the same exception.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.values = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, load):
+        with self.lock:
+            cached = self.values.get(key)
+            if cached is not None and time.monotonic() - cached[1] < self.ttl:
+                return cached[0]
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                if flight.error is None:
+                    self.values[key] = (flight.value, time.monotonic())
+                del self.flights[key]
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, key=None):
+        """Forget one key (or everything), so the next get() reloads it."""
+        with self.lock:
+            if key is None:
+                self.values.clear()
+            else:
+                self.values.pop(key, None)